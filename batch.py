@@ -0,0 +1,133 @@
+import sys
+import json
+import time
+import asyncio
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+from config import openai_max_concurrency, executor_max_workers
+from client import send_to_openai_async, run_sync, set_max_concurrency
+from parser import parse_response
+from telemetry import percentile
+
+console = Console(stderr=True)
+
+EXECUTE_MODES = ("none", "dry-run", "parallel")
+
+def read_prompts(f) -> list:
+    """Une requête par ligne : texte brut ou objet JSON {"prompt": ..., "id": ...}."""
+    items = []
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                obj = None
+            if isinstance(obj, dict) and obj.get("prompt"):
+                items.append({"id": obj.get("id"), "prompt": str(obj["prompt"])})
+                continue
+        items.append({"id": None, "prompt": line})
+    return items
+
+def check_syntax(command) -> dict:
+    # dry-run : vérification syntaxique par bash, sans rien exécuter
+    r = subprocess.run(["bash", "-n", "-c", command], stdin=subprocess.DEVNULL,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return {"command": command, "syntax_ok": r.returncode == 0, **({"error": r.stderr.strip()} if r.returncode else {})}
+
+def run_sequence(commands) -> list:
+    # Les commandes d'une même requête restent dans l'ordre ; les requêtes s'exécutent en parallèle
+    from executor import execute_command
+    return [{"command": c, "output": execute_command(c, live=False, persistent=False)} for c in commands]
+
+class BatchRunner:
+    """Envoie une liste de requêtes avec une concurrence bornée et écrit les résultats en JSONL.
+
+    Les lignes sont écrites dans l'ordre d'entrée, dès que toutes les précédentes sont prêtes.
+    """
+
+    def __init__(self, model, concurrency=None, execute="none", output=None):
+        self.model = model
+        self.concurrency = openai_max_concurrency if concurrency is None else concurrency
+        self.execute = execute
+        self.output = output or sys.stdout
+        self.latencies = []
+        self.errors = 0
+
+    async def _one(self, index, item, semaphore, workers) -> dict:
+        record = {"index": index, "prompt": item["prompt"]}
+        if item["id"] is not None:
+            record["id"] = item["id"]
+        started = None
+        try:
+            async with semaphore:
+                # Latence LLM mesurée hors attente dans la file et hors exécution des commandes
+                started = time.perf_counter()
+                response = await send_to_openai_async(self.model, item["prompt"], use_spinner=False,
+                                                      call_site="batch", required_keys=("commands",))
+            record["elapsed"] = round(time.perf_counter() - started, 3)
+            self.latencies.append(record["elapsed"])
+            parsed = parse_response(response, hide=True)
+            if not isinstance(parsed, dict):
+                raise ValueError("réponse non comprise")
+            for key in ("explanation", "commands", "script"):
+                if key in parsed:
+                    record[key] = parsed[key]
+            commands = [c for c in parsed.get("commands") or [] if isinstance(c, str)]
+            if commands and self.execute != "none":
+                fn = run_sequence if self.execute == "parallel" else (lambda cmds: [check_syntax(c) for c in cmds])
+                executed = time.perf_counter()
+                record["execution"] = await asyncio.get_running_loop().run_in_executor(workers, fn, commands)
+                record["execution_time"] = round(time.perf_counter() - executed, 3)
+        except Exception as e:
+            self.errors += 1
+            record["error"] = f"{type(e).__name__}: {e}"
+        if started is not None and "elapsed" not in record:
+            # Échec de la requête LLM : durée jusqu'à l'erreur
+            record["elapsed"] = round(time.perf_counter() - started, 3)
+            self.latencies.append(record["elapsed"])
+        return record
+
+    async def run_async(self, items) -> int:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # -j prime sur api.openai_max_concurrency : la limite du client ne doit pas le plafonner
+        set_max_concurrency(self.concurrency)
+        ready = {}
+        written = 0
+        with ThreadPoolExecutor(max_workers=executor_max_workers, thread_name_prefix="smartshell-batch") as workers:
+            tasks = [asyncio.ensure_future(self._one(i, item, semaphore, workers)) for i, item in enumerate(items)]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    record = await task
+                    ready[record["index"]] = record
+                    while written in ready:
+                        self.output.write(json.dumps(ready.pop(written), ensure_ascii=False) + "\n")
+                        self.output.flush()
+                        written += 1
+            finally:
+                for task in tasks:
+                    task.cancel()
+        return written
+
+    def run(self, items) -> dict:
+        started = time.perf_counter()
+        done = run_sync(self.run_async(items))
+        elapsed = time.perf_counter() - started
+        return {
+            "prompts": done,
+            "errors": self.errors,
+            "elapsed": elapsed,
+            "throughput": done / elapsed if elapsed > 0 else 0.0,
+            "p50": percentile(self.latencies, 50),
+            "p95": percentile(self.latencies, 95),
+        }
+
+def report(stats):
+    p50 = f"{stats['p50']:.2f}s" if stats["p50"] is not None else "-"
+    p95 = f"{stats['p95']:.2f}s" if stats["p95"] is not None else "-"
+    console.print(f"[bold green]{stats['prompts']} requêtes en {stats['elapsed']:.2f}s "
+                  f"({stats['throughput']:.2f} req/s), {stats['errors']} erreur(s), "
+                  f"latence p50 {p50} / p95 {p95}[/bold green]")
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Benchmarks des chemins critiques de SmartShell, entièrement hors-ligne.
+
+    python benchmarks/bench.py [--quick] [--only nom,...] [-o resultats.json]
+    python benchmarks/bench.py compare ancien.json nouveau.json [--threshold 0.15]
+
+Une config temporaire (SMARTSHELL_CONFIG) pointe vers le serveur mock lancé dans le
+processus : aucun réseau ni clé API. Les résultats JSON (médiane, min, moyenne par cas)
+servent de référence d'une version à l'autre.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Encodages tiktoken et un modèle qui les utilise, par ordre de préférence
+TIKTOKEN_MODELS = {"o200k_base": "gpt-4o", "cl100k_base": "gpt-4"}
+
+def cached_tiktoken_model() -> str or None:
+    """Modèle dont l'encodage tiktoken est déjà en cache local (le benchmark reste hors-ligne)."""
+    try:
+        import tiktoken  # noqa: F401
+    except ImportError:
+        return None
+    cache = os.environ.get("TIKTOKEN_CACHE_DIR") or os.environ.get("DATA_GYM_CACHE_DIR") \
+        or os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    for encoding, model in TIKTOKEN_MODELS.items():
+        url = f"https://openaipublic.blob.core.windows.net/encodings/{encoding}.tiktoken"
+        if os.path.exists(os.path.join(cache, hashlib.sha1(url.encode()).hexdigest())):
+            return model
+    return None
+
+def setup_environment(workdir):
+    """Config isolée : mock local, dossiers temporaires, cache et daemon désactivés.
+
+    Le modèle par défaut est un modèle tiktoken en cache, pour mesurer le vrai encodage
+    dans estimate_tokens ; à défaut, le repli len(texte)//3 (signalé dans le rapport).
+    """
+    import yaml
+    import mockserver
+    server = mockserver.start_in_thread(responses={"decision": {"action": "continue", "result": ""}})
+    paths = {k: os.path.join(workdir, k) for k in ("scripts_dir", "docs_dir", "context_dir", "cache_dir")}
+    paths["history_file"] = os.path.join(workdir, "history")
+    cfg = {
+        "api": {"openai_api_key": "bench", "openai_base_url": server.base_url, "openai_force_model": cached_tiktoken_model() or "mock-model"},
+        "paths": paths,
+        "updater": {"url": "http://127.0.0.1:9/updater"},
+        "cache": {"enabled": False},
+        "autosave": False,
+        "token_limit": 0,
+        "instructions": [],
+    }
+    path = os.path.join(workdir, "smartshell.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump(cfg, f)
+    os.environ["SMARTSHELL_CONFIG"] = path
+    os.environ["SMARTSHELL_NO_DAEMON"] = "1"
+    for d in paths.values():
+        os.makedirs(d, exist_ok=True)
+    return server
+
+def measure(fn, repeat=5, number=1, setup=None) -> dict:
+    """Durées par appel (s) sur `repeat` séries de `number` appels ; setup() avant chaque série."""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        for _ in range(number):
+            fn(arg) if setup else fn()
+        times.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(times), "min": min(times), "mean": statistics.mean(times),
+            "repeat": repeat, "number": number}
+
+def make_messages(n, size=200) -> list:
+    roles = ("user", "assistant", "bash")
+    return [{"role": roles[i % 3], "content": f"message {i} " + "lorem ipsum dolor sit amet " * (size // 27)}
+            for i in range(n)]
+
+def silence(*modules):
+    # Rendu rich conservé (même coût) mais écrit en mémoire
+    from rich.console import Console
+    for module in modules:
+        module.console = Console(file=io.StringIO(), force_terminal=True, width=120)
+
+# --- Cas de benchmark : chacun renvoie {nom: mesure} ---
+
+def tokenizer_path() -> str:
+    from config import openai_force_model
+    from tokens import get_encoder
+    enc = get_encoder(openai_force_model)
+    return f"tiktoken:{enc.name}" if enc else "fallback"
+
+def bench_estimate_tokens(quick):
+    from shell import estimate_tokens
+    from conversation import Context
+    from tokens import token_accountant
+    tokenizer = tokenizer_path()
+    if tokenizer == "fallback":
+        print("  aucun encodage tiktoken en cache : estimation len(texte)//3 mesurée", file=sys.stderr)
+    results = {}
+    for n in (100, 1000) if quick else (100, 1000, 10000):
+        messages = make_messages(n)
+
+        def cold():
+            token_accountant._memo.clear()
+            token_accountant._runs.clear()
+            return Context(messages)
+        results[f"estimate_tokens.cold.{n}"] = measure(lambda ctx: estimate_tokens(ctx), repeat=3, setup=cold)
+        ctx = Context(messages)
+        estimate_tokens(ctx)
+        results[f"estimate_tokens.warm.{n}"] = measure(lambda: estimate_tokens(ctx), number=100)
+        results[f"estimate_tokens.list.{n}"] = measure(lambda: estimate_tokens(messages), number=10)
+    return {name: {**m, "tokenizer": tokenizer} for name, m in results.items()}
+
+def bench_sanitize_context(quick):
+    from conversation import Context, sanitize_context
+    results = {}
+    for n in (1000,) if quick else (1000, 10000):
+        messages = make_messages(n)
+        ctx = Context(messages)
+        results[f"sanitize_context.list.{n}"] = measure(lambda: sanitize_context(messages), number=10)
+        results[f"sanitize_context.context.{n}"] = measure(lambda: sanitize_context(ctx), number=100)
+    return results
+
+def stream_parse(chunks):
+    from parser import StreamingResponseParser
+    p = StreamingResponseParser()
+    for chunk in chunks:
+        p.feed(chunk)
+    return p
+
+def bench_parse_response(quick):
+    from parser import parse_response
+    results = {}
+    for kb in (10, 100) if quick else (10, 100, 1000):
+        commands = [f"echo {'x' * 90}" for _ in range(kb * 10)]
+        payload = json.dumps({"explanation": "e" * (512 * kb), "commands": commands})
+        results[f"parse_response.json.{kb}kb"] = measure(lambda: parse_response(payload, hide=True), number=5)
+        chunks = [payload[i:i + 16] for i in range(0, len(payload), 16)]
+        results[f"parse_response.streaming.{kb}kb"] = measure(lambda: stream_parse(chunks), repeat=3)
+    return results
+
+def bench_ctxstore(quick, workdir):
+    import ctxstore
+    results = {}
+    for n in (1000, 10000) if quick else (1000, 100000):
+        messages = make_messages(n)
+        path = os.path.join(workdir, f"bench_{n}{ctxstore.EXTENSION}")
+        results[f"ctxstore.save.{n}"] = measure(lambda: ctxstore.save(path, messages), repeat=3)
+        results[f"ctxstore.load.{n}"] = measure(lambda: sum(1 for _ in ctxstore.iter_messages(path)), repeat=3)
+        results[f"ctxstore.load_last100.{n}"] = measure(lambda: sum(1 for _ in ctxstore.iter_messages(path, last=100)), repeat=3)
+        results[f"ctxstore.count.{n}"] = measure(lambda: ctxstore.count(path), number=10)
+    return results
+
+class _Delta:
+    def __init__(self, content):
+        self.content = content
+
+class _Choice:
+    def __init__(self, content):
+        self.delta = _Delta(content)
+
+class _Chunk:
+    def __init__(self, content):
+        self.choices = [_Choice(content)]
+
+class _SyntheticStream:
+    def __init__(self, deltas):
+        self.deltas = deltas
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for d in self.deltas:
+            yield _Chunk(d)
+
+class _Endpoint:
+    name = "synthetic"
+
+    def record_failure(self):
+        pass
+
+class _SyntheticPool:
+    """Remplace EndpointPool : flux de fragments générés localement, sans HTTP."""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+
+    async def create(self, model, pinned=False, **kwargs):
+        return _Endpoint(), _SyntheticStream(self.deltas)
+
+def bench_stream_preview(quick):
+    import client
+    silence(client)
+    n = 2000 if quick else 10000
+    body = json.dumps({"explanation": "mot " * n, "commands": ["ls -la"]})
+    deltas = [body[i:i + 4] for i in range(0, len(body), 4)]
+    original = client.get_pool
+    client.get_pool = lambda: _SyntheticPool(deltas)
+    try:
+        messages = [{"role": "user", "content": "bench"}]
+        spinner = measure(lambda: client.run_sync(client._request_completion("mock-model", messages, True)), repeat=3)
+        plain = measure(lambda: client.run_sync(client._request_completion("mock-model", messages, False, on_delta=lambda d: None)), repeat=3)
+    finally:
+        client.get_pool = original
+    per_chunk = lambda m: {**m, "per_chunk": m["median"] / len(deltas), "chunks": len(deltas)}
+    return {"stream.preview.spinner": per_chunk(spinner), "stream.preview.no_spinner": per_chunk(plain)}
+
+class _HedgeStream:
+    """Stream façon AsyncStream : __aiter__ est un générateur asynchrone, close() libère la connexion."""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.closed = False
+
+    async def __aiter__(self):
+        for d in self.deltas:
+            yield _Chunk(d)
+
+    async def close(self):
+        self.closed = True
+
+class _HedgeClient:
+    """Client dont les requêtes se terminent ensemble dès que `expected` sont lancées."""
+
+    def __init__(self, barrier, streams):
+        self.chat = self
+        self.completions = self
+        self.barrier = barrier
+        self.streams = streams
+
+    async def create(self, model, **kwargs):
+        await self.barrier()
+        stream = _HedgeStream(["{", "}"])
+        self.streams.append(stream)
+        return stream
+
+def bench_hedge(quick):
+    """Hedging : les deux requêtes couvertes aboutissent dans le même lot d'asyncio.wait.
+
+    Vérifie au passage que la requête gagnante est rendue et que la perdante est fermée.
+    """
+    import asyncio
+    from endpoints import Endpoint, EndpointPool
+    streams = []
+    state = {}
+
+    async def barrier():
+        # Les deux requêtes sont relâchées ensemble, une fois la requête couverte lancée
+        state["launched"] += 1
+        if state["launched"] == 2:
+            state["release"].set()
+        await state["release"].wait()
+
+    endpoints = [Endpoint(f"hedge-{i}", "bench") for i in range(2)]
+    for endpoint in endpoints:
+        endpoint._client = _HedgeClient(barrier, streams)
+    pool = EndpointPool(endpoints, hedge_percentile=50, hedge_min_samples=1)
+
+    async def hedged_call():
+        state["launched"], state["release"] = 0, asyncio.Event()
+        for endpoint in endpoints:
+            endpoint.latencies.clear()
+            endpoint.latencies.append(0.0005)
+        _, stream = await pool.create("mock-model", messages=[], stream=True)
+        chunks = [c.choices[0].delta.content async for c in stream]
+        await stream.close()
+        assert chunks == ["{", "}"], chunks
+
+    calls = 10 if quick else 50
+    result = measure(lambda: asyncio.run(hedged_call()), repeat=3, number=calls)
+    assert len(streams) == 2 * 3 * calls and all(s.closed for s in streams), "stream couvert non fermé"
+    return {"hedge.simultaneous": result}
+
+def bench_execute_command(quick):
+    import executor
+    silence(executor)
+    number = 20 if quick else 100
+    results = {
+        "execute_command.subprocess": measure(lambda: executor.execute_command("true", live=False, persistent=False), number=number),
+        "execute_command.session": measure(lambda: executor.execute_command("true", live=False, persistent=True), number=number),
+        "execute_command.subprocess.live": measure(lambda: executor.execute_command("true", live=True, persistent=False), number=number),
+    }
+    executor.get_session().close()
+    return results
+
+def bench_agentique(quick):
+    import smartshell
+    import executor
+    import client
+    silence(smartshell, executor, client)
+    smartshell.console.input = lambda *args, **kwargs: "a"
+    return {"agentique.end_to_end": measure(lambda: smartshell.agentique_mode("mock-model", "Libérer de l'espace disque"),
+                                            repeat=3 if quick else 5)}
+
+BENCHMARKS = {
+    "estimate_tokens": bench_estimate_tokens,
+    "sanitize_context": bench_sanitize_context,
+    "parse_response": bench_parse_response,
+    "ctxstore": bench_ctxstore,
+    "stream_preview": bench_stream_preview,
+    "hedge": bench_hedge,
+    "execute_command": bench_execute_command,
+    "agentique": bench_agentique,
+}
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(only=None, quick=False) -> dict:
+    with tempfile.TemporaryDirectory(prefix="smartshell-bench-") as workdir:
+        server = setup_environment(workdir)
+        from config import raw_version
+        report = {
+            "version": raw_version,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "quick": quick,
+            "tokenizer": tokenizer_path(),
+            "results": {},
+        }
+        try:
+            for name, bench in BENCHMARKS.items():
+                if only and name not in only:
+                    continue
+                print(f"• {name}...", file=sys.stderr, flush=True)
+                kwargs = {"workdir": workdir} if name == "ctxstore" else {}
+                report["results"].update(bench(quick, **kwargs))
+        finally:
+            server.shutdown()
+    return report
+
+def print_report(report):
+    print(f"tokenizer : {report['tokenizer']}")
+    for name, m in report["results"].items():
+        print(f"{name:45s} {m['median'] * 1000:10.3f} ms  (min {m['min'] * 1000:.3f} ms)")
+
+def compare(old, new, threshold) -> int:
+    """Compare deux résultats (médianes) ; code de sortie 1 si une régression dépasse le seuil
+    ou si un cas n'a pas mesuré le même chemin (ex. tiktoken d'un côté, repli de l'autre)."""
+    regressions = 0
+    for name, m in new["results"].items():
+        if name not in old["results"]:
+            print(f"{name:45s} {'nouveau':>10s}")
+            continue
+        if m.get("tokenizer") != old["results"][name].get("tokenizer"):
+            print(f"{name:45s} {'-':>10s}  NON COMPARABLE ({old['results'][name].get('tokenizer')} -> {m.get('tokenizer')})")
+            regressions += 1
+            continue
+        ratio = m["median"] / old["results"][name]["median"] if old["results"][name]["median"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  RÉGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  amélioration"
+        print(f"{name:45s} {ratio:9.2f}x{flag}")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks hors-ligne de SmartShell")
+    parser.add_argument("action", nargs="?", choices=["run", "compare"], default="run")
+    parser.add_argument("files", nargs="*", help="compare : ancien.json nouveau.json")
+    parser.add_argument("--quick", action="store_true", help="Tailles réduites (vérification rapide)")
+    parser.add_argument("--only", help=f"Cas à exécuter, séparés par des virgules ({', '.join(BENCHMARKS)})")
+    parser.add_argument("-o", "--output", help="Fichier JSON de résultats")
+    parser.add_argument("--threshold", type=float, default=0.15, help="compare : écart relatif toléré")
+    args = parser.parse_args()
+    if args.action == "compare":
+        if len(args.files) != 2:
+            parser.error("compare requiert deux fichiers de résultats")
+        with open(args.files[0]) as f_old, open(args.files[1]) as f_new:
+            sys.exit(compare(json.load(f_old), json.load(f_new), args.threshold))
+    report = run(set(args.only.split(",")) if args.only else None, args.quick)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Résultats écrits dans {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
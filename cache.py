@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import hashlib
+from config import cache_dir, cache_enabled, cache_ttl, cache_max_entries, cache_max_size_mb
+
+class ResponseCache:
+    """Cache disque des réponses déterministes (temperature=0), adressé par le hash des messages."""
+
+    def __init__(self, path, ttl=86400, max_entries=500, max_size_mb=50, enabled=True):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.enabled = enabled and bool(path)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, messages) -> str:
+        payload = json.dumps({"model": model, "messages": messages}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _file(self, key) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key) -> str or None:
+        if not self.enabled:
+            return None
+        path = self._file(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if self.ttl and time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            self.misses += 1
+            return None
+        # Rafraîchir le mtime : l'éviction retire les entrées les moins récemment utilisées
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry.get("response")
+
+    def put(self, key, model, response):
+        if not self.enabled or not response:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"created": time.time(), "model": model, "response": response}, f)
+            os.replace(tmp, path)
+        except OSError:
+            self._remove(tmp)
+            return
+        self.evict()
+
+    def _entries(self) -> list:
+        entries = []
+        try:
+            with os.scandir(self.path) as it:
+                for e in it:
+                    if e.name.endswith(".json"):
+                        st = e.stat()
+                        entries.append((st.st_mtime, st.st_size, e.path))
+        except OSError:
+            pass
+        return entries
+
+    def evict(self):
+        entries = self._entries()
+        now = time.time()
+        if self.ttl:
+            expired = [e for e in entries if now - e[0] > self.ttl]
+            for e in expired:
+                self._remove(e[2])
+            entries = [e for e in entries if now - e[0] <= self.ttl]
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total -= size
+
+    def clear(self) -> int:
+        entries = self._entries()
+        for e in entries:
+            self._remove(e[2])
+        self.hits = self.misses = 0
+        return len(entries)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "enabled": self.enabled,
+            "entries": len(entries),
+            "size": sum(e[1] for e in entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+response_cache = ResponseCache(cache_dir, ttl=cache_ttl, max_entries=cache_max_entries,
+                               max_size_mb=cache_max_size_mb, enabled=cache_enabled)
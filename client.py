@@ -1,89 +1,303 @@
-import os
-from openai import OpenAI
-from rich.console import Console, Group
-from rich.live import Live
-from rich.panel import Panel
-from rich.text import Text
-from rich.spinner import Spinner
-from rich import box
-from rich.columns import Columns
-import re
-from contextlib import nullcontext
-from config import openai_api_key, openai_base_url, openai_force_model, token_limit, config
-from utils import get_os_info
+import asyncio
+import queue
+import threading
+import time
+from rich.console import Console
+from contextlib import nullcontext, contextmanager
+from config import openai_api_key, openai_base_url, openai_force_model, openai_max_concurrency, openai_endpoints, openai_hedge_percentile, openai_request_timeout, model_routes, routing_cascade, token_limit
+from prompts import prompt_builder
+from endpoints import EndpointPool
+from parser import StreamingResponseParser, parse_response
+from preview import StreamPreview
+from cache import response_cache
+import telemetry
 
 console = Console()
-if not openai_api_key:
-    console.print("[red]Clé API OpenAI manquante dans smartshell.yaml[/red]")
-    exit(1)
-
-client = OpenAI(api_key=openai_api_key, base_url=openai_base_url) if openai_base_url else OpenAI(api_key=openai_api_key)
-
-def send_to_openai(model, prompt, context=None, use_spinner=True) -> str:
-    # Préparer prompt et messages
-    os_info = get_os_info()
-    user = os.environ.get("USER", "user")
-    sys_prompt = f"""
-You are an intelligent Bash wizard on {os_info['name']} {os_info['version']}.
-User: {user}.
-Answer in the language of the user's request.
-Don't use interactive commands.
-Output only a JSON object with keys: explanation (string), commands (array of strings), script (string, optional).
-If the user prompt explicitly requests a script (by mentioning 'script') or if the task cannot be accomplished by commands only, include the 'script' key containing a complete bash script fulfilling the request.
-"""
-    msgs = []
-    if context:
-        msgs.extend(context)
-    msgs.append({"role": "user", "content": prompt})
-    system_messages = [{"role": "system", "content": sys_prompt}]
-    for instr in config.instructions:
-        system_messages.append({"role": "system", "content": f"User special instruction: {instr}"})
-    all_messages = system_messages + msgs
-    if use_spinner:
-        # Stream with spinner and live preview
-        content = ""
-        display_content = ""
-        stream = client.chat.completions.create(
-            model=openai_force_model if model is None else model,
+
+# Un client asynchrone par endpoint : chaque pool HTTP est partagé par toutes les requêtes.
+# Construit à la première requête réseau (une réponse servie par le cache n'importe pas openai)
+_pool = None
+
+def get_pool() -> EndpointPool:
+    global _pool
+    if _pool is None:
+        if not openai_api_key and not (openai_endpoints and all(ep.get("api_key") for ep in openai_endpoints)):
+            console.print("[red]Clé API OpenAI manquante dans smartshell.yaml[/red]")
+            exit(1)
+        _pool = EndpointPool.from_config(openai_api_key, openai_base_url, openai_endpoints, openai_hedge_percentile,
+                                        openai_request_timeout)
+    return _pool
+
+# Boucle asyncio dédiée, dans un thread, pour que les appels synchrones réutilisent le même pool
+_loop = None
+_loop_lock = threading.Lock()
+_semaphore = None
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="smartshell-llm", daemon=True).start()
+    return _loop
+
+def _get_semaphore():
+    # Créé paresseusement dans la boucle partagée
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(openai_max_concurrency)
+    return _semaphore
+
+def set_max_concurrency(limit):
+    """Remplace la limite de requêtes simultanées (batch -j) ; à appeler avant tout envoi."""
+    global _semaphore
+    _semaphore = asyncio.Semaphore(limit)
+
+def submit(coro):
+    """Planifie une coroutine sur la boucle partagée et renvoie un concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+def run_sync(coro):
+    """Exécute une coroutine sur la boucle partagée et attend son résultat."""
+    future = submit(coro)
+    try:
+        return future.result()
+    except BaseException:
+        # Ctrl+C côté shell : ne pas laisser la requête tourner en arrière-plan
+        future.cancel()
+        raise
+
+def build_messages(prompt, context=None) -> list:
+    return prompt_builder.build(prompt, context)
+
+async def send_to_openai_async(model, prompt, context=None, use_spinner=True, use_cache=True, on_delta=None,
+                               call_site="other", required_keys=None) -> str:
+    all_messages = build_messages(prompt, context)
+    model = openai_force_model if model is None else model
+    routed = model_routes.get(call_site)
+    if not routed or routed == model:
+        return await _send_messages(model, all_messages, use_spinner, use_cache, on_delta, call_site)
+    if not routing_cascade:
+        return await _send_messages(routed, all_messages, use_spinner, use_cache, on_delta, call_site, pinned=True)
+    # Cascade : modèle léger d'abord, sans streamer vers l'appelant tant que la réponse n'est pas validée
+    content = await _send_messages(routed, all_messages, use_spinner, use_cache, None, call_site, pinned=True)
+    if not _is_complete(content, required_keys):
+        content = await _send_messages(model, all_messages, use_spinner, use_cache, None, call_site, escalated=True)
+    if on_delta:
+        on_delta(content)
+    return content
+
+def _is_complete(content, required_keys) -> bool:
+    parsed = parse_response(content or "", hide=True)
+    return isinstance(parsed, dict) and all(k in parsed for k in (required_keys or ()))
+
+async def _send_messages(model, all_messages, use_spinner, use_cache, on_delta, call_site, pinned=False, escalated=False) -> str:
+    started = time.perf_counter()
+    stats = {
+        "site": call_site,
+        "model": model,
+        "messages": len(all_messages),
+        "prompt_chars": sum(len(m.get("content") or "") for m in all_messages),
+        "stream": bool(use_spinner or on_delta),
+        "cached": False,
+    }
+    if escalated:
+        stats["escalated"] = True
+    # Réponses déterministes (temperature=0) : servies depuis le cache disque si possible
+    cache_key = response_cache.key(model, all_messages) if use_cache else None
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            if on_delta:
+                on_delta(cached)
+            stats.update(cached=True, output_chars=len(cached), total=time.perf_counter() - started)
+            telemetry.record(stats)
+            return cached
+    stats["prep"] = time.perf_counter() - started
+    try:
+        content = await _request_completion(model, all_messages, use_spinner, on_delta, stats, pinned)
+    except BaseException as e:
+        stats["error"] = type(e).__name__
+        raise
+    finally:
+        stats["total"] = time.perf_counter() - started
+        telemetry.record(stats)
+    if cache_key:
+        response_cache.put(cache_key, model, content)
+    return content
+
+async def _request_completion(model, all_messages, use_spinner, on_delta=None, stats=None, pinned=False) -> str:
+    stats = {} if stats is None else stats
+    queued = time.perf_counter()
+    async with _get_semaphore():
+        sent = time.perf_counter()
+        stats["queued"] = sent - queued
+        if use_spinner or on_delta:
+            # Stream with spinner and live preview
+            parts = []
+            chunks = 0
+            first = None
+            endpoint, stream = await get_pool().create(
+                model,
+                messages=all_messages,
+                max_tokens=(token_limit or 4000),
+                temperature=0.0,
+                response_format={'type': 'json_object'},
+                stream=True,
+                pinned=pinned
+            )
+            stats["endpoint"] = endpoint.name
+            preview = StreamPreview() if use_spinner else None
+            if use_spinner:
+                from rich.live import Live
+            live_ctx = Live(preview, refresh_per_second=10, transient=True, console=console) if use_spinner else nullcontext()
+            with live_ctx, _track_stream(endpoint):
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = getattr(chunk.choices[0].delta, "content", "") or ""
+                    if delta:
+                        if first is None:
+                            first = time.perf_counter()
+                            stats["ttft"] = first - sent
+                        chunks += 1
+                        parts.append(delta)
+                        if on_delta:
+                            on_delta(delta)
+                        if preview:
+                            preview.feed(delta)
+            content = "".join(parts)
+            # Un fragment de stream correspond en pratique à un token
+            _record_output(stats, content, chunks, first, time.perf_counter())
+            return content
+        # Mode bloquant sans animation
+        endpoint, r = await get_pool().create(
+            model,
             messages=all_messages,
             max_tokens=(token_limit or 4000),
             temperature=0.0,
             response_format={'type': 'json_object'},
-            stream=True
+            pinned=pinned
         )
-        spinner = Spinner("dots", text="[bold green]SmartShell pense…[/bold green]", style="green")
-        snippet_renderable = Text("", style="green")
-        with Live(Group(spinner, snippet_renderable), refresh_per_second=10, transient=True, console=console) as live:
-            for chunk in stream:
-                delta = getattr(chunk.choices[0].delta, "content", "") or ""
-                if delta:
-                    content += delta
-                    # Remove JSON keys for display
-                    disp = re.sub(r'\"[a-zA-Z_]+\":', '', delta)
-                    disp = disp.replace('{','').replace('}','').replace('"','')
-                    display_content += disp
-                    snippet_text = display_content if len(display_content) <= 300 else display_content[-300:]
-                    renderable = Group(spinner, Text(snippet_text, style="purple"))
-                    live.update(renderable)
+        stats["endpoint"] = endpoint.name
+        done = time.perf_counter()
+        stats["ttft"] = done - sent
+        content = r.choices[0].message.content
+        usage = getattr(r, "usage", None)
+        tokens = getattr(usage, "completion_tokens", None) or len(content or "") // 4
+        _record_output(stats, content, tokens, sent, done)
         return content
-    # Mode bloquant sans animation
-    r = client.chat.completions.create(
-        model=openai_force_model if model is None else model,
-        messages=all_messages,
-        max_tokens=(token_limit or 4000),
-        temperature=0.0,
-        response_format={'type': 'json_object'}
+
+@contextmanager
+def _track_stream(endpoint):
+    # Une coupure en cours de stream compte comme un échec de l'endpoint
+    try:
+        yield
+    except Exception:
+        endpoint.record_failure()
+        raise
+
+def _record_output(stats, content, tokens, first, end):
+    stats["output_chars"] = len(content or "")
+    stats["output_tokens"] = tokens
+    if first is not None:
+        stats["stream_duration"] = end - first
+        if end > first and tokens:
+            stats["tokens_per_s"] = tokens / (end - first)
+
+class ResponseStream:
+    """Réponse en cours de génération, consommable événement par événement depuis le thread du shell."""
+
+    def __init__(self):
+        self.parser = StreamingResponseParser()
+        self.future = None
+        self._events = queue.Queue()
+
+    def _on_delta(self, delta):
+        # Appelé dans le thread de la boucle asyncio
+        for event in self.parser.feed(delta):
+            self._events.put(event)
+
+    def _on_done(self, _future):
+        self._events.put(None)
+
+    def __iter__(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            yield event
+
+    def result(self) -> str:
+        try:
+            return self.future.result()
+        except BaseException:
+            self.future.cancel()
+            raise
+
+    def cancel(self):
+        self.future.cancel()
+
+def stream_to_openai(model, prompt, context=None, use_cache=True, call_site="other") -> ResponseStream:
+    """Lance la requête en arrière-plan ; l'explication et chaque commande sont émises dès leur fermeture."""
+    stream = ResponseStream()
+    stream.future = submit(send_to_openai_async(model, prompt, context, use_spinner=False,
+                                                use_cache=use_cache, on_delta=stream._on_delta,
+                                                call_site=call_site))
+    stream.future.add_done_callback(stream._on_done)
+    return stream
+
+async def gather_openai(calls, return_exceptions=False, call_site="other") -> list:
+    """Envoie plusieurs requêtes (model, prompt, context) en parallèle, résultats dans l'ordre."""
+    return await asyncio.gather(
+        *(send_to_openai_async(model, prompt, context, use_spinner=False, call_site=call_site) for model, prompt, context in calls),
+        return_exceptions=return_exceptions
     )
-    return r.choices[0].message.content
 
-def openai2doc(model, messages) -> str:
-    messages.append({"role":"user","content":"Create me a documentation"})
+async def openai2doc_async(model, messages) -> str:
+    msgs = messages + [{"role":"user","content":"Create me a documentation"}]
     sys_prompt = "Based on messages, génère une doc Markdown (sans conclusion)."
-    r = client.chat.completions.create(
-        model=openai_force_model if model is None else model,
-        messages=[{"role":"system","content":sys_prompt}]+messages,
-        max_tokens=4000, temperature=0.0
-    )
-    res = r.choices[0].message.content
-    messages.pop()
-    return res
+    model = openai_force_model if model is None else model
+    pinned = "doc" in model_routes
+    model = model_routes.get("doc", model)
+    all_messages = [{"role":"system","content":sys_prompt}]+msgs
+    started = time.perf_counter()
+    stats = {"site": "doc", "model": model, "messages": len(all_messages), "stream": False, "cached": False,
+             "prompt_chars": sum(len(m.get("content") or "") for m in all_messages)}
+    try:
+        async with _get_semaphore():
+            sent = time.perf_counter()
+            stats["queued"] = sent - started
+            endpoint, r = await get_pool().create(
+                model,
+                messages=all_messages,
+                max_tokens=4000, temperature=0.0,
+                pinned=pinned
+            )
+        stats["endpoint"] = endpoint.name
+        content = r.choices[0].message.content
+        done = time.perf_counter()
+        stats["ttft"] = done - sent
+        usage = getattr(r, "usage", None)
+        _record_output(stats, content, getattr(usage, "completion_tokens", None) or len(content or "") // 4, sent, done)
+    except BaseException as e:
+        stats["error"] = type(e).__name__
+        raise
+    finally:
+        stats["total"] = time.perf_counter() - started
+        telemetry.record(stats)
+    return content
+
+def send_to_openai(model, prompt, context=None, use_spinner=True, use_cache=True, call_site="other", required_keys=None) -> str:
+    return run_sync(send_to_openai_async(model, prompt, context, use_spinner, use_cache,
+                                         call_site=call_site, required_keys=required_keys))
+
+def prefetch_openai(model, prompt, context=None, **kwargs):
+    """Lance la requête en arrière-plan sans affichage ; renvoie un concurrent.futures.Future."""
+    return submit(send_to_openai_async(model, prompt, context, use_spinner=False, **kwargs))
+
+def send_many_to_openai(calls, return_exceptions=False, call_site="other") -> list:
+    return run_sync(gather_openai(calls, return_exceptions, call_site))
+
+def openai2doc(model, messages) -> str:
+    return run_sync(openai2doc_async(model, messages))
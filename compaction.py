@@ -0,0 +1,85 @@
+import json
+from rich.console import Console
+from client import send_to_openai
+from config import token_limit, compaction_threshold, compaction_keep_recent, compaction_segment_ratio
+from conversation import Message
+
+console = Console()
+
+SUMMARY_PROMPT = (
+    "Tu maintiens un résumé glissant d'une conversation dans un shell. "
+    "Mets à jour le résumé existant avec les nouveaux messages, de façon concise mais détaillée, "
+    "en conservant commandes, chemins, résultats et décisions importants. "
+    "Répond uniquement en JSON avec la clé 'summary'.\n\n"
+    "Résumé existant :\n{summary}\n\nNouveaux messages :\n{messages}"
+)
+
+class Compactor:
+    """Compaction glissante du contexte, commune au shell et au mode agentique.
+
+    Au-delà du seuil, seul le plus ancien segment non résumé est envoyé au LLM et fusionné
+    dans le résumé courant (premier message du contexte) ; les derniers échanges restent
+    intacts. Chaque compaction coûte donc un prompt borné, pas une fenêtre entière.
+    """
+
+    def __init__(self, limit, threshold=0.8, keep_recent=6, segment_ratio=0.25, max_rounds=4):
+        self.limit = limit
+        self.threshold = threshold
+        self.keep_recent = keep_recent
+        self.segment_ratio = segment_ratio
+        self.max_rounds = max_rounds
+
+    def needed(self, context, model) -> bool:
+        return bool(self.limit) and context.tokens(model) >= self.limit * self.threshold
+
+    def compact(self, context, model, call_site="summary") -> bool:
+        """Compacte jusqu'à repasser sous le seuil ; False si rien n'a pu être résumé."""
+        compacted = False
+        for _ in range(self.max_rounds):
+            if not self.needed(context, model):
+                break
+            segment = self._segment(context, model)
+            if segment is None:
+                break
+            if not compacted:
+                console.print("[bold blue]SmartShell résume votre conversation...[/bold blue]")
+            if not self._summarize(context, model, segment, call_site):
+                break
+            compacted = True
+        return compacted
+
+    def _segment(self, context, model) -> tuple or None:
+        """Segment le plus ancien non résumé (start, end), borné en tokens ; None si rien à résumer."""
+        start = 1 if len(context) > 0 and context[0].summary else 0
+        stop = len(context) - self.keep_recent
+        if stop - start < 1:
+            return None
+        budget = int(self.limit * self.segment_ratio)
+        end, used = start, 0
+        while end < stop and (end == start or used + context[end].tokens(model) <= budget):
+            used += context[end].tokens(model)
+            end += 1
+        return start, end
+
+    def _summarize(self, context, model, segment, call_site) -> bool:
+        start, end = segment
+        max_chars = int(self.limit * self.segment_ratio) * 3
+        lines = "\n".join(f"{m.role}: {m.content[:max_chars]}" for m in context[start:end])
+        previous = context[0].content if start else "(aucun)"
+        # required_keys : une réponse du modèle léger sans 'summary' est escaladée (routing.cascade)
+        response = send_to_openai(model, SUMMARY_PROMPT.format(summary=previous, messages=lines), [],
+                                  call_site=call_site, required_keys=("summary",))
+        try:
+            summary = json.loads(response).get("summary")
+        except (ValueError, AttributeError):
+            summary = None
+        if not summary:
+            # Résumé absent : garder les messages plutôt que de les remplacer par une réponse invalide
+            console.print("[bold red]Résumé invalide, compaction abandonnée.[/bold red]")
+            return False
+        if not isinstance(summary, str):
+            summary = json.dumps(summary, ensure_ascii=False)
+        context.splice(0, end, [Message("system", summary, summary=True)])
+        return True
+
+compactor = Compactor(token_limit, compaction_threshold, compaction_keep_recent, compaction_segment_ratio)
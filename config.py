@@ -5,7 +5,8 @@ from pathlib import Path
 class Config:
     def __init__(self, path=None):
         if path is None:
-            path = Path(__file__).parent / "smartshell.yaml"
+            # SMARTSHELL_CONFIG : autre fichier de config (daemon de test, benchmarks...)
+            path = os.environ.get("SMARTSHELL_CONFIG") or Path(__file__).parent / "smartshell.yaml"
         self.path = Path(os.path.expanduser(str(path)))
         if not self.path.exists():
             # Config manquante : lancer automatiquement le wizard
@@ -18,10 +19,18 @@ class Config:
             if not self.path.exists():
                 raise FileNotFoundError(f"Config file not found after wizard: {self.path}")
         with open(self.path, "r") as f:
-            cfg = yaml.safe_load(f)
+            # Chargeur C de libyaml si disponible : la config est lue à chaque démarrage
+            cfg = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
         self.api = cfg.get("api", {})
         self.paths = cfg.get("paths", {})
         self.updater = cfg.get("updater", {})
+        self.cache = cfg.get("cache", {})
+        self.routing = cfg.get("routing", {})
+        self.agentique = cfg.get("agentique", {})
+        self.compaction = cfg.get("compaction", {})
+        self.retrieval = cfg.get("retrieval", {})
+        self.executor = cfg.get("executor", {})
+        self.autosave = cfg.get("autosave", True)
         self.raw_version = 18
         self.token_limit = cfg.get("token_limit", 0)
         if self.token_limit != 0 and self.token_limit < 1024:
@@ -32,6 +41,8 @@ class Config:
                 self.paths[key] = os.path.expanduser(val)
         # Load persistent instructions
         self.instructions = cfg.get("instructions", [])
+        # Incrémenté à chaque modification : invalide le préfixe de prompt mémorisé
+        self.instructions_version = 0
 
     def save(self):
         """Save the current configuration, including instructions, back to the YAML file."""
@@ -39,6 +50,13 @@ class Config:
             "api": self.api,
             "paths": self.paths,
             "updater": self.updater,
+            "cache": self.cache,
+            "routing": self.routing,
+            "agentique": self.agentique,
+            "compaction": self.compaction,
+            "retrieval": self.retrieval,
+            "executor": self.executor,
+            "autosave": self.autosave,
             "token_limit": self.token_limit,
             "instructions": self.instructions,
         }
@@ -48,12 +66,14 @@ class Config:
     def add_instruction(self, text: str):
         """Add a new instruction and persist it."""
         self.instructions.append(text)
+        self.instructions_version += 1
         self.save()
 
     def remove_instruction(self, index: int):
         """Remove an instruction by index (0-based) and persist."""
         if 0 <= index < len(self.instructions):
             self.instructions.pop(index)
+            self.instructions_version += 1
             self.save()
         else:
             raise IndexError(f"Instruction index out of range: {index}")
@@ -63,13 +83,58 @@ config = Config()
 openai_api_key = config.api.get("openai_api_key")
 openai_base_url = config.api.get("openai_base_url")
 openai_force_model = config.api.get("openai_force_model")
+openai_max_concurrency = config.api.get("openai_max_concurrency", 8)
+# Endpoints multiples (base_url, api_key et model optionnels) et percentile de hedging (0 = désactivé)
+openai_endpoints = config.api.get("endpoints") or []
+openai_hedge_percentile = config.api.get("hedge_percentile", 0)
+# Délai maximal (s) d'une requête, ou entre deux fragments d'un stream, avant bascule
+openai_request_timeout = config.api.get("request_timeout", 60)
 # Paths
 scripts_dir = config.paths.get("scripts_dir")
 docs_dir = config.paths.get("docs_dir")
 context_dir = config.paths.get("context_dir")
 history_file = config.paths.get("history_file")
+cache_dir = config.paths.get("cache_dir", os.path.expanduser("~/.sshell/cache"))
+# Socket Unix du daemon résident (smartshell daemon)
+daemon_socket = config.paths.get("daemon_socket") or os.path.join(cache_dir, "daemon.sock")
+# Rapports de profilage (--profile, commande profile), à côté de docs_dir par défaut
+profile_dir = config.paths.get("profile_dir") or (os.path.join(os.path.dirname(docs_dir.rstrip(os.sep)), "profiles") if docs_dir else None)
+# Journal de télémétrie LLM, à côté de context_dir par défaut
+perf_file = config.paths.get("perf_file") or (os.path.join(os.path.dirname(context_dir.rstrip(os.sep)), "perf.jsonl") if context_dir else None)
 # Updater
 updater_url = config.updater.get("url")
+updater_timeout = config.updater.get("timeout", 3)
+# Durée de validité (s) du dernier résultat de vérification, mis en cache sur disque
+updater_ttl = config.updater.get("ttl", 86400)
+# Routage des modèles par type d'appel (agentique_decision, agentique_summary, summary, ...)
+model_routes = {k: v for k, v in config.routing.items() if k != "cascade" and v}
+# Cascade : repasser sur le modèle principal si la réponse du modèle léger est invalide
+routing_cascade = config.routing.get("cascade", False)
+# Agentique : génération spéculative des commandes de l'étape suivante
+agentique_prefetch = config.agentique.get("prefetch", False)
+# Compaction glissante du contexte (seuil en fraction de token_limit)
+compaction_threshold = config.compaction.get("threshold", 0.8)
+compaction_keep_recent = config.compaction.get("keep_recent", 6)
+compaction_segment_ratio = config.compaction.get("segment_ratio", 0.25)
+# Recherche locale (BM25) dans les contextes, docs et scripts passés
+retrieval_auto_attach = config.retrieval.get("auto_attach", False)
+retrieval_top_k = config.retrieval.get("top_k", 3)
+retrieval_token_budget = config.retrieval.get("token_budget", 1000)
+# Exécution des commandes : octets conservés en début et fin de sortie
+executor_head_bytes = config.executor.get("head_bytes", 4096)
+executor_tail_bytes = config.executor.get("tail_bytes", 4096)
+# "session" : un bash persistant (cwd et variables conservés), "subprocess" : un shell par commande
+executor_backend = config.executor.get("backend", "session")
+# Exécution parallèle des commandes indépendantes (sur indication du LLM)
+executor_parallel = config.executor.get("parallel", False)
+executor_max_workers = config.executor.get("max_workers", 4)
+# Journal d'autosauvegarde du contexte (restauration après crash)
+autosave = config.autosave
+# Cache des réponses LLM
+cache_enabled = config.cache.get("enabled", True)
+cache_ttl = config.cache.get("ttl", 86400)
+cache_max_entries = config.cache.get("max_entries", 500)
+cache_max_size_mb = config.cache.get("max_size_mb", 50)
 # Version
 raw_version = config.raw_version
 # Limite de tokens
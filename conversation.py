@@ -0,0 +1,160 @@
+from parser import parse_response
+from tokens import token_accountant
+
+API_ROLES = ('system', 'user', 'assistant', 'tool')
+_UNPARSED = object()
+
+class Message:
+    """Message du contexte, avec son nombre de tokens et son JSON parsé mis en cache."""
+
+    __slots__ = ("role", "content", "summary", "_api", "_tokens", "_parsed")
+
+    def __init__(self, role, content, summary=False):
+        self.role = role
+        self.content = content or ""
+        # Résumé glissant produit par la compaction
+        self.summary = summary
+        # Rôles non standard (ex: 'bash') envoyés comme 'user'
+        self._api = {"role": role if role in API_ROLES else "user", "content": self.content}
+        self._tokens = None
+        self._parsed = _UNPARSED
+
+    @classmethod
+    def of(cls, message):
+        if isinstance(message, cls):
+            return message
+        return cls(message.get("role"), message.get("content", ""), bool(message.get("summary")))
+
+    @property
+    def parsed(self) -> dict or None:
+        """Contenu JSON décodé une seule fois (None si ce n'est pas du JSON)."""
+        if self._parsed is _UNPARSED:
+            parsed = parse_response(self.content, hide=True)
+            self._parsed = parsed if isinstance(parsed, dict) else None
+        return self._parsed
+
+    def tokens(self, model=None) -> int:
+        if self._tokens is None or self._tokens[0] != model:
+            self._tokens = (model, token_accountant.count(self.content, model))
+        return self._tokens[1]
+
+    def api(self) -> dict:
+        return self._api
+
+    def to_dict(self) -> dict:
+        if self.summary:
+            return {"role": self.role, "content": self.content, "summary": True}
+        return {"role": self.role, "content": self.content}
+
+    # Compatibilité avec l'ancien format dict ({"role": ..., "content": ...})
+    def __getitem__(self, key):
+        if key in ("role", "content"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in ("role", "content", "summary") else default
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content[:40]!r})"
+
+class Context:
+    """Contexte de conversation : ajout en O(1), vue API prête à l'envoi et total de tokens tenu à jour.
+
+    Si un journal d'autosauvegarde est attaché, chaque modification y est consignée.
+    """
+
+    def __init__(self, messages=(), journal=None):
+        self._messages = []
+        self._api = []
+        self._totals = {}
+        self.journal = None
+        self.extend(messages)
+        if journal is not None:
+            self.attach_journal(journal)
+
+    def attach_journal(self, journal):
+        """Attache un journal d'autosauvegarde, initialisé avec le contenu actuel."""
+        journal.rewrite(self)
+        self.journal = journal
+
+    def _record(self, op):
+        if self.journal is not None:
+            self.journal.record(op, self)
+
+    def append(self, message):
+        message = Message.of(message)
+        self._messages.append(message)
+        self._api.append(message.api())
+        for model in self._totals:
+            self._totals[model] += message.tokens(model)
+        self._record({"op": "add", "m": message.to_dict()})
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def pop(self, index=-1) -> Message:
+        index = range(len(self._messages))[index]
+        message = self._messages.pop(index)
+        self._api.pop(index)
+        for model in self._totals:
+            self._totals[model] -= message.tokens(model)
+        self._record({"op": "pop", "i": index})
+        return message
+
+    def clear(self):
+        self._messages.clear()
+        self._api.clear()
+        self._totals.clear()
+        self._record({"op": "clear"})
+
+    def truncate(self, keep):
+        """Ne conserve que les `keep` derniers messages."""
+        if len(self._messages) > keep:
+            del self[:len(self._messages) - keep]
+
+    def splice(self, start, stop, messages):
+        """Remplace les messages [start:stop] par `messages`."""
+        start, stop, _ = slice(start, stop).indices(len(self._messages))
+        messages = [Message.of(m) for m in messages]
+        self._messages[start:stop] = messages
+        self._api[start:stop] = [m.api() for m in messages]
+        self._totals.clear()
+        self._record({"op": "splice", "start": start, "stop": max(start, stop), "m": [m.to_dict() for m in messages]})
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            self.splice(index.start, index.stop, [])
+        else:
+            self.pop(index)
+
+    def __getitem__(self, index):
+        return self._messages[index]
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __bool__(self):
+        return bool(self._messages)
+
+    def api_view(self) -> list:
+        """Messages au format de l'API (copie superficielle, sans reconstruction des dicts)."""
+        return list(self._api)
+
+    def tokens(self, model=None) -> int:
+        if model not in self._totals:
+            self._totals[model] = sum(m.tokens(model) for m in self._messages)
+        return self._totals[model]
+
+    def to_dicts(self) -> list:
+        return [m.to_dict() for m in self._messages]
+
+def sanitize_context(raw_context) -> list:
+    """Contexte au format API : rôles non standard (ex: 'bash') convertis en 'user'."""
+    if isinstance(raw_context, Context):
+        return raw_context.api_view()
+    return [Message.of(m).api() for m in raw_context]
@@ -0,0 +1,215 @@
+import os
+import json
+import zlib
+import struct
+import time
+
+# En-tête : magic, version, position et taille de l'index (écrit en fin de fichier)
+MAGIC = b"SSCTX"
+VERSION = 1
+HEADER = struct.Struct(">5sBQI")
+BLOCK_SIZE = 256
+EXTENSION = ".ssctx"
+
+class ContextFormatError(ValueError):
+    pass
+
+def save(path, messages, block_size=BLOCK_SIZE) -> int:
+    """Écrit les messages par blocs compressés (zlib) suivis de l'index ; renvoie le nombre de messages."""
+    blocks = []
+    count = 0
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        batch = []
+
+        def flush():
+            data = zlib.compress("\n".join(batch).encode("utf-8"), 6)
+            blocks.append([f.tell(), len(data), count - len(batch), len(batch)])
+            f.write(data)
+            batch.clear()
+
+        for message in messages:
+            batch.append(json.dumps(message.to_dict() if hasattr(message, "to_dict") else message, ensure_ascii=False))
+            count += 1
+            if len(batch) >= block_size:
+                flush()
+        if batch:
+            flush()
+        index = zlib.compress(json.dumps({"version": VERSION, "count": count, "created": time.time(),
+                                          "blocks": blocks}).encode("utf-8"))
+        index_offset = f.tell()
+        f.write(index)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, index_offset, len(index)))
+    os.replace(tmp, path)
+    return count
+
+def is_ssctx(path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_index(f) -> dict:
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ContextFormatError("Fichier de contexte tronqué")
+    magic, version, index_offset, index_length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ContextFormatError("Format de contexte inconnu")
+    if version > VERSION:
+        raise ContextFormatError(f"Version de contexte non supportée: {version}")
+    if not index_offset:
+        raise ContextFormatError("Index absent (sauvegarde interrompue)")
+    f.seek(index_offset)
+    return json.loads(zlib.decompress(f.read(index_length)))
+
+def count(path) -> int:
+    """Nombre de messages, lu depuis l'index ou en comptant les lignes (ancien format texte)."""
+    if is_ssctx(path):
+        with open(path, "rb") as f:
+            return read_index(f)["count"]
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+def iter_messages(path, last=None):
+    """Itère sur les messages sans tout charger en mémoire ; `last` : seulement les N derniers.
+
+    Seuls les blocs nécessaires sont lus et décompressés. L'ancien format (JSON par ligne) est accepté.
+    """
+    if not is_ssctx(path):
+        yield from _iter_legacy(path, last)
+        return
+    with open(path, "rb") as f:
+        index = read_index(f)
+        skip = max(0, index["count"] - last) if last is not None else 0
+        for offset, length, first, n in index["blocks"]:
+            if first + n <= skip:
+                continue
+            f.seek(offset)
+            lines = zlib.decompress(f.read(length)).decode("utf-8").split("\n")
+            for line in lines[max(0, skip - first):]:
+                yield json.loads(line)
+
+def _iter_legacy(path, last):
+    if last is not None:
+        from collections import deque
+        with open(path, "r") as f:
+            lines = deque((l for l in f if l.strip()), maxlen=last)
+    else:
+        with open(path, "r") as f:
+            lines = [l for l in f if l.strip()]
+    for line in lines:
+        yield json.loads(line)
+
+class Journal:
+    """Journal d'autosauvegarde append-only des opérations sur le contexte.
+
+    Un fichier par processus (autosave-<pid>.journal) ; à la fermeture propre il est supprimé,
+    après un crash il peut être rejoué pour restaurer la session.
+    """
+
+    def __init__(self, directory, pid=None):
+        self.pid = pid or os.getpid()
+        self.path = os.path.join(directory, f"autosave-{self.pid}.journal")
+        self.ops = 0
+        self.disabled = False
+        self._f = None
+
+    def _file(self):
+        if self._f is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._f = open(self.path, "a", encoding="utf-8")
+        return self._f
+
+    def record(self, op, context=None):
+        if self.disabled:
+            return
+        try:
+            f = self._file()
+            f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            self.ops += 1
+            # Journal trop long par rapport au contexte : réécrire un instantané
+            if context is not None and self.ops > 1000 and self.ops > 4 * len(context):
+                self.rewrite(context)
+        except OSError as e:
+            # Autosauvegarde best-effort (disque plein, dossier supprimé...) : ne pas interrompre la commande
+            self.disabled = True
+            self.close(remove=False)
+            from rich.console import Console
+            Console(stderr=True).print(f"[red]Autosauvegarde désactivée: {e}[/red]")
+
+    def rewrite(self, context):
+        if self._f:
+            self._f.close()
+            self._f = None
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for message in context:
+                f.write(json.dumps({"op": "add", "m": message.to_dict()}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        self.ops = len(context)
+
+    def close(self, remove=True):
+        if self._f:
+            try:
+                self._f.close()
+            except OSError:
+                pass
+            self._f = None
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def replay(path) -> list:
+        """Reconstitue la liste des messages (dicts) à partir d'un journal."""
+        messages = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # Dernière ligne incomplète lors d'un crash
+                    break
+                kind = op.get("op")
+                if kind == "add":
+                    messages.append(op["m"])
+                elif kind == "pop":
+                    messages.pop(op["i"])
+                elif kind == "splice":
+                    messages[op["start"]:op["stop"]] = op.get("m", [])
+                elif kind == "clear":
+                    messages.clear()
+        return messages
+
+    @staticmethod
+    def orphans(directory) -> list:
+        """Journaux laissés par des sessions terminées anormalement (processus disparu)."""
+        found = []
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return found
+        for name in names:
+            if not (name.startswith("autosave-") and name.endswith(".journal")):
+                continue
+            try:
+                pid = int(name[len("autosave-"):-len(".journal")])
+            except ValueError:
+                continue
+            if pid == os.getpid() or _alive(pid):
+                continue
+            found.append(os.path.join(directory, name))
+        return sorted(found, key=os.path.getmtime)
+
+def _alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+from config import config, daemon_socket, openai_force_model, raw_version
+
+def _config_mtime():
+    try:
+        return os.stat(config.path).st_mtime
+    except OSError:
+        return None
+
+# --- Côté CLI : aucun import lourd, le travail est fait par le daemon ---
+
+def _events(payload, timeout=None):
+    """Envoie une requête au daemon et itère sur ses événements ; rien si aucun daemon n'écoute."""
+    if not daemon_socket or os.environ.get("SMARTSHELL_NO_DAEMON"):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(daemon_socket)
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            for line in f:
+                yield json.loads(line)
+    except (OSError, ValueError):
+        pass
+    finally:
+        sock.close()
+
+def request(payload, on_delta=None, timeout=None) -> dict or None:
+    """Envoie une requête au daemon ; None si aucun daemon n'écoute ou si la connexion est perdue."""
+    for event in _events(payload, timeout):
+        if "delta" in event:
+            if on_delta:
+                on_delta(event["delta"])
+        elif "accepted" not in event:
+            return event
+    return None
+
+def _final(events, on_delta=None) -> dict or None:
+    for event in events:
+        if "delta" not in event:
+            return event
+        if on_delta:
+            on_delta(event["delta"])
+    return None
+
+def ask(model, prompt, use_cache=True, use_spinner=True) -> str or None:
+    """Réponse LLM via le daemon, ou None pour repasser par le client en processus."""
+    payload = {"op": "ask", "model": model, "prompt": prompt, "use_cache": use_cache,
+               "config_mtime": _config_mtime()}
+    events = _events(payload)
+    # rich.live et l'aperçu ne sont chargés qu'une fois la requête acceptée par un daemon
+    reply = next(events, None)
+    if reply is not None and "accepted" in reply:
+        reply = None
+        if use_spinner:
+            from rich.live import Live
+            from preview import StreamPreview
+            preview = StreamPreview()
+            with Live(preview, refresh_per_second=10, transient=True):
+                reply = _final(events, preview.feed)
+        else:
+            reply = _final(events)
+    if reply is None or reply.get("stale"):
+        return None
+    if "error" in reply:
+        raise RuntimeError(reply["error"])
+    return reply.get("content")
+
+def status() -> dict or None:
+    return request({"op": "ping"}, timeout=2)
+
+def stop() -> bool:
+    return request({"op": "stop"}, timeout=2) is not None
+
+# --- Côté daemon ---
+
+class Daemon:
+    """Processus résident servant les requêtes `ask` sur une socket Unix locale.
+
+    Config, client OpenAI (pool HTTP et TLS), tokenizer, préfixe de prompt et caches restent
+    chargés entre les appels. Une requête émise avec une config plus récente que celle du
+    daemon est refusée (stale) : le CLI la traite alors lui-même.
+    """
+
+    def __init__(self, path=daemon_socket):
+        self.path = path
+        self.config_mtime = _config_mtime()
+        self.started = time.time()
+        self.requests = 0
+        self._stop = None
+
+    def warm_up(self):
+        from client import get_pool
+        from prompts import prompt_builder
+        from tokens import get_encoder
+        for endpoint in get_pool().endpoints:
+            endpoint.client
+        get_encoder(openai_force_model)
+        prompt_builder.prefix()
+
+    async def handle(self, reader, writer):
+        from client import send_to_openai_async
+
+        def send(event):
+            writer.write(json.dumps(event).encode() + b"\n")
+
+        try:
+            req = json.loads(await reader.readline() or b"{}")
+            op = req.get("op")
+            if op == "ping":
+                send({"pid": os.getpid(), "version": raw_version, "uptime": time.time() - self.started,
+                      "requests": self.requests})
+            elif op == "stop":
+                send({"stopping": True})
+                self._stop.set()
+            elif op == "ask":
+                if req.get("config_mtime") != self.config_mtime:
+                    send({"error": "configuration modifiée depuis le démarrage du daemon", "stale": True})
+                    return
+                self.requests += 1
+                send({"accepted": True})
+                content = await send_to_openai_async(req.get("model"), req["prompt"], use_spinner=False,
+                                                     use_cache=req.get("use_cache", True),
+                                                     on_delta=lambda delta: send({"delta": delta}),
+                                                     call_site="ask")
+                send({"content": content})
+            else:
+                send({"error": f"opération inconnue: {op}"})
+        except Exception as e:
+            send({"error": f"{type(e).__name__}: {e}"})
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+            except OSError:
+                pass
+
+    async def _serve(self):
+        import asyncio
+        self._stop = asyncio.Event()
+        # Socket accessible au seul utilisateur courant
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle, path=self.path)
+        finally:
+            os.umask(umask)
+        async with server:
+            await self._stop.wait()
+
+    def serve(self) -> int:
+        from rich.console import Console
+        from client import submit
+        console = Console()
+        if status() is not None:
+            console.print(f"[yellow]Un daemon SmartShell écoute déjà sur {self.path}[/yellow]")
+            return 1
+        if os.path.exists(self.path):
+            # Socket orpheline d'un daemon arrêté brutalement
+            os.remove(self.path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.warm_up()
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        future = submit(self._serve())
+        console.print(f"[green]Daemon SmartShell prêt sur {self.path} (pid {os.getpid()})[/green]")
+        try:
+            future.result()
+        except (KeyboardInterrupt, SystemExit):
+            future.cancel()
+        finally:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        console.print("[green]Daemon arrêté.[/green]")
+        return 0
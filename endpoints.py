@@ -0,0 +1,213 @@
+import time
+import asyncio
+from collections import deque
+from telemetry import percentile
+
+class Endpoint:
+    """Un backend compatible OpenAI et son état de santé (latence, erreurs récentes)."""
+
+    def __init__(self, name, api_key, base_url=None, model=None, timeout=60, max_retries=0):
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._api_key = api_key
+        self._client = None
+        self.latencies = deque(maxlen=50)
+        self.outcomes = deque(maxlen=20)
+        self.ewma = None
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    @property
+    def client(self):
+        # openai est long à importer : chargé seulement à la première requête réseau
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Pas de reprises internes au SDK : c'est le pool qui bascule sur l'endpoint suivant
+            kwargs = {"api_key": self._api_key, "timeout": self.timeout, "max_retries": self.max_retries}
+            self._client = AsyncOpenAI(base_url=self.base_url, **kwargs) if self.base_url else AsyncOpenAI(**kwargs)
+        return self._client
+
+    def resolve_model(self, model, pinned=False):
+        # Un modèle imposé par le routage par type d'appel n'est pas remplacé
+        return model if pinned else (self.model or model)
+
+    def record_success(self, latency):
+        self.requests += 1
+        self.latencies.append(latency)
+        self.outcomes.append(1)
+        self.ewma = latency if self.ewma is None else 0.8 * self.ewma + 0.2 * latency
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def record_failure(self):
+        self.requests += 1
+        self.errors += 1
+        self.outcomes.append(0)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= 3:
+            # Mise à l'écart temporaire, exponentielle jusqu'à une minute
+            self.down_until = time.monotonic() + min(60, 5 * 2 ** (self.consecutive_failures - 3))
+
+    @property
+    def error_rate(self) -> float:
+        return (len(self.outcomes) - sum(self.outcomes)) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def score(self) -> float:
+        # Latence lissée pénalisée par le taux d'erreur ; un endpoint jamais mesuré passe en priorité
+        latency = self.ewma if self.ewma is not None else 0.0
+        return (latency + 0.1) * (1 + 4 * self.error_rate)
+
+class _FirstChunkStream:
+    """Stream dont le premier fragment a déjà été lu (pour mesurer le TTFT par endpoint)."""
+
+    def __init__(self, stream, iterator, first):
+        self._stream = stream
+        self._iterator = iterator
+        self._first = first
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        if self._first is not None:
+            first, self._first = self._first, None
+            yield first
+        async for chunk in self._iterator:
+            yield chunk
+
+    async def close(self):
+        # L'itérateur est un générateur asynchrone (aclose) ; la connexion est portée par le stream
+        await self._iterator.aclose()
+        await self._stream.close()
+
+class EndpointPool:
+    """Répartit les requêtes sur plusieurs endpoints : le plus sain d'abord, bascule en cas
+    d'erreur et requête couverte (hedging) quand la latence dépasse un percentile."""
+
+    def __init__(self, endpoints, hedge_percentile=0, hedge_min_samples=5):
+        self.endpoints = endpoints
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+    @classmethod
+    def from_config(cls, api_key, base_url=None, endpoints=None, hedge_percentile=0, timeout=60):
+        endpoints = endpoints or []
+        # Un endpoint seul n'a nulle part où basculer : il garde les reprises du SDK
+        retries = 0 if len(endpoints) > 1 else 2
+        pool = []
+        for i, ep in enumerate(endpoints):
+            pool.append(Endpoint(ep.get("name") or ep.get("base_url") or f"endpoint-{i}",
+                                 ep.get("api_key") or api_key, ep.get("base_url"), ep.get("model"),
+                                 timeout=ep.get("timeout") or timeout, max_retries=retries))
+        if not pool:
+            pool.append(Endpoint(base_url or "openai", api_key, base_url, timeout=timeout, max_retries=retries))
+        return cls(pool, hedge_percentile=hedge_percentile or 0)
+
+    def ranked(self) -> list:
+        up = sorted((e for e in self.endpoints if e.available), key=Endpoint.score)
+        down = sorted((e for e in self.endpoints if not e.available), key=lambda e: e.down_until)
+        return up + down
+
+    def _hedge_delay(self, endpoint):
+        if not self.hedge_percentile or len(endpoint.latencies) < self.hedge_min_samples:
+            return None
+        return percentile(endpoint.latencies, self.hedge_percentile)
+
+    async def _call(self, endpoint, model, pinned, kwargs):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await endpoint.client.chat.completions.create(model=endpoint.resolve_model(model, pinned), **kwargs)
+            if kwargs.get("stream"):
+                # Lire le premier fragment : la latence mesurée est alors un vrai TTFT
+                iterator = response.__aiter__()
+                try:
+                    first = await iterator.__anext__()
+                except StopAsyncIteration:
+                    first = None
+                response = _FirstChunkStream(response, iterator, first)
+        except asyncio.CancelledError:
+            if response is not None:
+                # Requête couverte annulée pendant la lecture du premier fragment
+                asyncio.ensure_future(_discard(response))
+            raise
+        except Exception:
+            endpoint.record_failure()
+            raise
+        endpoint.record_success(time.perf_counter() - started)
+        return response
+
+    async def create(self, model, pinned=False, **kwargs):
+        """Équivalent de chat.completions.create ; renvoie (endpoint, réponse).
+
+        pinned : le modèle demandé prime sur le modèle propre à chaque endpoint.
+        """
+        candidates = self.ranked()
+        pending = {}
+        launched = 0
+        hedged = False
+        last_error = None
+
+        def launch():
+            nonlocal launched
+            endpoint = candidates[launched]
+            launched += 1
+            pending[asyncio.ensure_future(self._call(endpoint, model, pinned, kwargs))] = endpoint
+
+        launch()
+        try:
+            while pending:
+                delay = None
+                if not hedged and len(pending) == 1 and launched < len(candidates):
+                    delay = self._hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Latence au-delà du percentile : doubler la requête sur le prochain endpoint
+                    hedged = True
+                    launch()
+                    continue
+                winner = None
+                for task in done:
+                    endpoint = pending.pop(task)
+                    if task.exception() is not None:
+                        from openai import BadRequestError  # déjà chargé par la requête
+                        last_error = task.exception()
+                        if isinstance(last_error, BadRequestError):
+                            # Requête invalide : inutile de la rejouer ailleurs
+                            raise last_error
+                    elif winner is None:
+                        winner = (endpoint, task.result())
+                    else:
+                        await _discard(task.result())
+                if winner:
+                    return winner
+                if not pending and launched < len(candidates):
+                    launch()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_close_late_result)
+
+async def _discard(response):
+    # Fermeture best-effort d'une réponse perdante : ne doit jamais faire échouer la gagnante
+    close = getattr(response, "close", None)
+    if close and asyncio.iscoroutinefunction(close):
+        try:
+            await close()
+        except Exception:
+            pass
+
+def _close_late_result(task):
+    # Requête couverte perdante terminée malgré l'annulation : fermer sa connexion
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(_discard(task.result()))
@@ -1,22 +1,443 @@
-import subprocess, os, uuid, re
-from config import scripts_dir
+import subprocess, os, sys, uuid, re, selectors, select, shlex, signal, threading, shutil, struct
+import pty, tty, termios, fcntl
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from contextlib import nullcontext
+from config import scripts_dir, executor_head_bytes, executor_tail_bytes, executor_parallel, executor_max_workers, executor_backend
 from rich.console import Console
+from rich.live import Live
+from preview import StreamPreview
 
 console = Console()
 
-def execute_command(command) -> str:
+class OutputCapture:
+    """Capture bornée d'un flux de sortie : début et fin conservés, le milieu seulement compté.
+
+    La mémoire utilisée (et donc les tokens envoyés au LLM) ne dépend pas de la taille
+    de la sortie. Une sortie contenant un octet nul est considérée comme binaire et
+    n'est jamais décodée.
+    """
+
+    def __init__(self, head=None, tail=None):
+        self.head_limit = executor_head_bytes if head is None else head
+        self.head = bytearray()
+        self.tail = deque(maxlen=executor_tail_bytes if tail is None else tail)
+        self.bytes = 0
+        self.lines = 0
+        self.binary = False
+
+    def feed(self, data: bytes):
+        self.bytes += len(data)
+        self.lines += data.count(b"\n")
+        if not self.binary and b"\0" in data:
+            self.binary = True
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        self.tail.extend(data)
+
+    @property
+    def omitted(self) -> int:
+        return self.bytes - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        if self.binary:
+            return f"[sortie binaire : {self.bytes} octets]"
+        text = self.head.decode(errors="replace")
+        if self.omitted:
+            text += f"\n[... {self.omitted} octets omis, {self.bytes} octets / {self.lines} lignes au total ...]\n"
+        return text + bytes(self.tail).decode(errors="replace")
+
+def execute_command(command, live=True, persistent=None) -> str:
     # Exécute sans exception pour toujours récupérer returncode
     try:
-        r = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False)
+        out, err = OutputCapture(), OutputCapture()
+        if persistent is None:
+            persistent = executor_backend == "session"
+        if persistent:
+            code = get_session().run(command, out, err, live)
+        else:
+            code = stream_command(command, out, err, live)
         # Construire un message incluant le code de retour
-        msg = f"Code: {r.returncode}\n{r.stdout}"
-        if r.stderr:
-            msg += f"\n{r.stderr}"
+        msg = f"Code: {code}\n{out.text()}"
+        if err.bytes:
+            msg += f"\n{err.text()}"
         return msg
     except Exception as e:
         # En cas d'erreur imprévue
         return f"[red]Erreur interne cmd `{command}`: {e}[/red]"
 
+def stream_command(command, out, err, live=True) -> int:
+    """Exécute `command` en lisant stdout/stderr au fil de l'eau dans deux OutputCapture.
+
+    Avec `live`, les dernières lignes s'affichent pendant l'exécution. Renvoie le code de retour.
+    """
+    proc = subprocess.Popen(command, shell=True, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    preview = StreamPreview(size=600, text=f"[bold green]{command}[/bold green]", raw=False) if live else None
+    sel = selectors.DefaultSelector()
+    sel.register(proc.stdout, selectors.EVENT_READ, out)
+    sel.register(proc.stderr, selectors.EVENT_READ, err)
+    try:
+        with Live(preview, refresh_per_second=10, transient=True, console=console) if live else nullcontext():
+            while sel.get_map():
+                for key, _ in sel.select():
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        sel.unregister(key.fileobj)
+                        continue
+                    key.data.feed(data)
+                    if preview and not key.data.binary:
+                        preview.feed(data.decode(errors="replace"))
+        return proc.wait()
+    except BaseException:
+        # Ctrl+C : ne pas laisser la commande tourner en arrière-plan
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        sel.close()
+        proc.stdout.close()
+        proc.stderr.close()
+
+class _Delimited:
+    """Transmet la sortie d'un flux de la session à une OutputCapture jusqu'au marqueur de fin de commande.
+
+    Le marqueur est suivi d'informations (code de retour...) terminées par `end`, conservées dans `trailer`.
+    """
+
+    def __init__(self, capture, marker: bytes, end=b"\n"):
+        self.capture = capture
+        self.marker = marker
+        self.end = end
+        self.pending = b""
+        self.trailer = None
+        self.done = False
+
+    def feed(self, data: bytes) -> bytes:
+        if self.trailer is not None:
+            self.trailer += data
+            self.done = self.end in self.trailer
+            return b""
+        buf = self.pending + data
+        i = buf.find(self.marker)
+        if i >= 0:
+            emitted, self.pending = buf[:i], b""
+            self.trailer = buf[i + len(self.marker):]
+            self.done = self.end in self.trailer
+        else:
+            # Garder de quoi reconnaître un marqueur coupé entre deux lectures
+            cut = max(len(buf) - len(self.marker) + 1, 0)
+            emitted, self.pending = buf[:cut], buf[cut:]
+        if emitted:
+            self.capture.feed(emitted)
+        return emitted
+
+class ShellSession:
+    """Processus bash persistant dans lequel les commandes sont exécutées les unes après les autres.
+
+    Les variables exportées sont conservées d'une commande à l'autre, sans fork/exec ni
+    démarrage de shell à chaque appel. La fin de chaque commande est repérée par un marqueur
+    unique écrit sur stdout (suivi du code de retour et de $PWD) et sur stderr.
+    Le répertoire courant reste celui du processus Python dans les deux sens : la session s'y
+    place s'il a changé (mode bash, `cd` de SmartShell), et un `cd` dans la session est
+    reporté par os.chdir, donc aussi vu par l'invite et les exécutions hors session
+    (parallèles, batch). Le shell est relancé s'il s'est terminé (exit, kill, Ctrl+C).
+    """
+
+    def __init__(self, shell="bash"):
+        self.shell = shell
+        self.proc = None
+        self.cwd = None
+        self._lock = threading.Lock()
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        self.close()
+        # Groupe de processus dédié : Ctrl+C ne l'atteint pas, close() tue aussi les commandes lancées
+        self.proc = subprocess.Popen([self.shell, "--noprofile", "--norc"], stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     cwd=os.getcwd(), start_new_session=True)
+        self.cwd = os.getcwd()
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.proc.wait()
+        for f in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+            f.close()
+        self.proc = None
+
+    def _follow(self, cwd):
+        # `cd` dans la session : le processus Python (invite, exécutions hors session) suit
+        self.cwd = cwd
+        if cwd != os.getcwd():
+            try:
+                os.chdir(cwd)
+            except OSError:
+                pass
+
+    def _drain(self, sel):
+        # Sortie résiduelle de tâches en arrière-plan : ne pas l'attribuer à la commande suivante
+        while any(os.read(key.fd, 65536) for key, _ in sel.select(timeout=0)):
+            pass
+
+    def run(self, command, out, err, live=True) -> int:
+        with self._lock:
+            if not self.alive():
+                self.start()
+            marker = f"__SMARTSHELL_{uuid.uuid4().hex}__"
+            cwd = os.getcwd()
+            # Répertoire changé côté Python depuis la dernière commande : s'y placer d'abord
+            chdir = f"cd -- {shlex.quote(cwd)} 2>/dev/null\n" if cwd != self.cwd else ""
+            # eval : une erreur de syntaxe dans la commande ne peut pas avaler le marqueur.
+            # Code de retour et $PWD suivent le marqueur, terminés par NUL (absent des chemins)
+            script = (f"{chdir}eval {shlex.quote(command)} </dev/null\n"
+                      f"printf '%s%d;%s\\0' '{marker}' \"$?\" \"$PWD\"\n"
+                      f"printf '%s\\n' '{marker}' >&2\n")
+            streams = {self.proc.stdout: _Delimited(out, marker.encode(), end=b"\0"),
+                       self.proc.stderr: _Delimited(err, marker.encode())}
+            preview = StreamPreview(size=600, text=f"[bold green]{command}[/bold green]", raw=False) if live else None
+            sel = selectors.DefaultSelector()
+            for f, d in streams.items():
+                sel.register(f, selectors.EVENT_READ, d)
+            try:
+                self._drain(sel)
+                self.proc.stdin.write(script.encode())
+                self.proc.stdin.flush()
+                with Live(preview, refresh_per_second=10, transient=True, console=console) if live else nullcontext():
+                    while sel.get_map():
+                        for key, _ in sel.select():
+                            data = os.read(key.fd, 65536)
+                            if not data:
+                                # Le shell s'est terminé pendant la commande (exit, kill...)
+                                sel.unregister(key.fileobj)
+                                continue
+                            emitted = key.data.feed(data)
+                            if key.data.done:
+                                sel.unregister(key.fileobj)
+                            if preview and emitted and not key.data.capture.binary:
+                                preview.feed(emitted.decode(errors="replace"))
+                stdout = streams[self.proc.stdout]
+                if stdout.done:
+                    code, _, pwd = stdout.trailer.split(b"\0", 1)[0].partition(b";")
+                    self._follow(os.fsdecode(pwd))
+                    return int(code)
+                for d in streams.values():
+                    if d.pending:
+                        d.capture.feed(d.pending)
+                code = self.proc.wait()
+                self.close()
+                return code
+            except BrokenPipeError:
+                code = self.proc.wait()
+                self.close()
+                return code
+            except BaseException:
+                # Ctrl+C : tuer la commande en cours avec la session, relancée à l'appel suivant
+                self.close()
+                raise
+            finally:
+                sel.close()
+
+_ANSI_RE = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[()][0-9A-Za-z]|\x1b[@-Z\\-_]")
+
+def strip_ansi(text) -> str:
+    """Retire les séquences d'échappement d'une sortie de terminal (pour le contexte)."""
+    return _ANSI_RE.sub("", text).replace("\r\n", "\n")
+
+class PtyShell:
+    """Bash interactif persistant dans un pseudo-terminal, utilisé par le mode bash.
+
+    La sortie s'affiche telle quelle (couleurs, programmes plein écran, Ctrl+C transmis au
+    programme) et est capturée en même temps dans une OutputCapture bornée : rien n'est
+    ré-exécuté pour l'extraire. La fin d'une commande est signalée par une séquence OSC émise
+    par PROMPT_COMMAND avec $? et $PWD, l'invite de bash étant vide.
+    """
+
+    def __init__(self, shell="bash"):
+        self.shell = shell
+        self.pid = None
+        self.fd = None
+        self.status = None
+        self.token = uuid.uuid4().hex
+        self.marker = f"\033]777;{self.token};".encode()
+
+    def alive(self) -> bool:
+        if self.pid is None:
+            return False
+        pid, status = os.waitpid(self.pid, os.WNOHANG)
+        if pid:
+            self.status = os.waitstatus_to_exitcode(status)
+            self.pid = None
+        return self.pid is not None
+
+    def start(self):
+        self.close()
+        env = dict(os.environ, PS1="", PS2="",
+                   PROMPT_COMMAND=f'printf "\\033]777;{self.token};%s;%s\\007" "$?" "$PWD"')
+        pid, fd = pty.fork()
+        if pid == 0:
+            try:
+                os.execvpe(self.shell, [self.shell, "--noprofile", "--norc", "--noediting", "-i"], env)
+            finally:
+                os._exit(127)
+        self.pid, self.fd = pid, fd
+        # Attendre la première invite (sortie de démarrage ignorée)
+        self._pump(_Delimited(OutputCapture(0, 0), self.marker, end=b"\x07"), skip_echo=False, interactive=False)
+
+    def close(self):
+        if self.pid is not None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            os.waitpid(self.pid, 0)
+            self.pid = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _resize(self):
+        cols, rows = shutil.get_terminal_size()
+        fcntl.ioctl(self.fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+
+    def run(self, command, capture) -> tuple:
+        """Exécute `command` ; renvoie (code de retour, répertoire courant du shell ou None)."""
+        if not self.alive():
+            self.start()
+        self._resize()
+        os.write(self.fd, command.encode() + b"\n")
+        delimited = _Delimited(capture, self.marker, end=b"\x07")
+        try:
+            ended = self._pump(delimited, skip_echo=True, interactive=True)
+        except BaseException:
+            self.close()
+            raise
+        if not ended:
+            # Le shell s'est terminé (exit, exec...) : relancé à la commande suivante
+            if delimited.pending:
+                capture.feed(delimited.pending)
+            if self.pid is not None:
+                _, status = os.waitpid(self.pid, 0)
+                self.status, self.pid = os.waitstatus_to_exitcode(status), None
+            self.close()
+            return self.status, None
+        code, _, cwd = delimited.trailer.split(b"\x07", 1)[0].partition(b";")
+        return int(code or 0), os.fsdecode(cwd)
+
+    def _pump(self, delimited, skip_echo, interactive) -> bool:
+        # La ligne de commande renvoyée en écho par le terminal précède toujours la sortie
+        stdin = sys.stdin.fileno() if interactive and sys.stdin.isatty() else None
+        saved = termios.tcgetattr(stdin) if stdin is not None else None
+        out = sys.stdout.buffer if interactive else None
+        try:
+            if stdin is not None:
+                # Mode brut : frappes (Ctrl+C compris) transmises telles quelles au programme
+                tty.setraw(stdin)
+            while not delimited.done:
+                ready, _, _ = select.select([self.fd] + ([stdin] if stdin is not None else []), [], [])
+                if stdin in ready:
+                    os.write(self.fd, os.read(stdin, 1024))
+                if self.fd not in ready:
+                    continue
+                try:
+                    data = os.read(self.fd, 65536)
+                except OSError:
+                    data = b""  # EIO : plus aucun processus côté terminal
+                if not data:
+                    return False
+                if skip_echo:
+                    i = data.find(b"\n")
+                    if i < 0:
+                        continue
+                    data, skip_echo = data[i + 1:], False
+                emitted = delimited.feed(data)
+                if out and emitted:
+                    out.write(emitted)
+                    out.flush()
+            return True
+        finally:
+            if saved is not None:
+                termios.tcsetattr(stdin, termios.TCSADRAIN, saved)
+
+_session = None
+
+def get_session() -> ShellSession:
+    global _session
+    if _session is None:
+        _session = ShellSession()
+    return _session
+
+def command_dependencies(commands, hints=None) -> list or None:
+    """Dépendances de chaque commande (indices des commandes à attendre), ou None pour un enchaînement séquentiel.
+
+    Le parallélisme n'est utilisé que si l'option executor.parallel est active et que la
+    réponse du LLM l'autorise explicitement : "parallel": true (commandes indépendantes)
+    ou "depends": [[...], ...] (pour chaque commande, indices des commandes précédentes à attendre).
+    hints peut être une fonction renvoyant la réponse : elle n'est appelée que si le parallélisme
+    est possible, pour ne pas attendre la fin du stream avant d'exécuter en séquentiel.
+    """
+    if not executor_parallel or len(commands) < 2:
+        return None
+    hints = (hints() if callable(hints) else hints) or {}
+    if not isinstance(hints, dict):
+        return None
+    depends = hints.get("depends")
+    if depends is None:
+        return [[] for _ in commands] if hints.get("parallel") is True else None
+    if not isinstance(depends, list) or len(depends) != len(commands):
+        return None
+    deps = []
+    for i, d in enumerate(depends):
+        d = [d] if isinstance(d, int) else (d or [])
+        # Seules les dépendances vers des commandes précédentes sont acceptées (pas de cycle)
+        if not isinstance(d, list) or not all(isinstance(j, int) and 0 <= j < i for j in d):
+            return None
+        deps.append(d)
+    return deps
+
+def run_commands(commands, hints=None, on_result=None) -> list:
+    """Exécute les commandes, en parallèle si les indications du LLM le permettent.
+
+    Les résultats sont renvoyés dans l'ordre d'origine ; on_result(command, result) est
+    appelé dans cet ordre, au fil de l'eau en séquentiel et une fois tout terminé en parallèle.
+    """
+    deps = command_dependencies(commands, hints)
+    if deps is None:
+        results = []
+        for command in commands:
+            result = execute_command(command)
+            if on_result:
+                on_result(command, result)
+            results.append(result)
+        return results
+    futures = []
+
+    def run(i):
+        # Les dépendances ont un indice inférieur : déjà en cours ou terminées (file FIFO), pas d'interblocage
+        for j in deps[i]:
+            futures[j].exception()
+        # Une session bash n'exécute qu'une commande à la fois : processus indépendants en parallèle,
+        # lancés dans le répertoire courant (celui de la session), mais un `cd` n'y survit pas
+        return execute_command(commands[i], live=False, persistent=False)
+
+    with console.status(f"[bold green]Exécution de {len(commands)} commandes en parallèle…[/bold green]"):
+        with ThreadPoolExecutor(max_workers=executor_max_workers, thread_name_prefix="smartshell-cmd") as pool:
+            futures.extend(pool.submit(run, i) for i in range(len(commands)))
+            results = [f.result() for f in futures]
+    if on_result:
+        for command, result in zip(commands, results):
+            on_result(command, result)
+    return results
+
 def generate_script(content) -> str or None:
     m = re.search(r"# NAME=(.*?)\n", content)
     if m:
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Serveur local compatible OpenAI (chat completions) pour les tests de charge et de latence.
+
+Pointer `openai_base_url` vers http://127.0.0.1:8765/v1 pour faire tourner le shell
+et le mode agentique sans réseau ni quota API.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_RESPONSES = {
+    "plan": {"plan": ["Inspecter l'espace disque", "Lister les processus les plus gourmands"]},
+    "commands": {"commands": ["df -h", "ps aux --sort=-%mem | head -n 5"]},
+    "decision": {"action": "complete", "result": "Objectif atteint (réponse simulée)."},
+    "summary": {"summary": "Résumé simulé de la conversation."},
+    "default": {
+        "explanation": "Réponse simulée par le serveur mock SmartShell.",
+        "commands": ["uname -a", "uptime"],
+    },
+    "doc": "# Documentation\n\nDocumentation simulée par le serveur mock SmartShell.\n",
+}
+
+# Découpage approximatif en tokens : un mot et l'espace qui le précède
+_TOKEN_RE = re.compile(r"\s*\S{1,8}|\s+")
+
+class MockSettings:
+    def __init__(self, ttft=0.0, tps=0.0, error_rate=0.0, error_status=500, responses=None, seed=None):
+        self.ttft = ttft
+        self.tps = tps
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.responses = dict(DEFAULT_RESPONSES)
+        if responses:
+            self.responses.update(responses)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+def pick_response(body, responses) -> str:
+    """Choisit la réponse préenregistrée selon la clé JSON demandée dans le dernier prompt."""
+    messages = body.get("messages") or []
+    last = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    if body.get("response_format", {}).get("type") != "json_object":
+        kind = "doc"
+    elif "'plan'" in last and "'action'" not in last:
+        kind = "plan"
+    elif "'commands'" in last:
+        kind = "commands"
+    elif "'action'" in last:
+        kind = "decision"
+    elif "'summary'" in last:
+        kind = "summary"
+    else:
+        kind = "default"
+    payload = responses.get(kind, responses["default"])
+    return payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "SmartShellMock/1.0"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "smartshell"}]})
+        else:
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        settings = self.server.settings
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+        with settings.lock:
+            settings.requests += 1
+            failed = settings.random.random() < settings.error_rate
+            if failed:
+                settings.errors += 1
+        if settings.ttft:
+            time.sleep(settings.ttft)
+        if failed:
+            self._send_json(settings.error_status, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+        content = pick_response(body, settings.responses)
+        tokens = _TOKEN_RE.findall(content)
+        model = body.get("model") or "mock-model"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages") or []) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        if not body.get("stream"):
+            if settings.tps:
+                time.sleep(len(tokens) / settings.tps)
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta, finish_reason=None, extra=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            if extra:
+                chunk.update(extra)
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        try:
+            event({"role": "assistant", "content": ""})
+            interval = 1.0 / settings.tps if settings.tps else 0
+            for token in tokens:
+                if interval:
+                    time.sleep(interval)
+                event({"content": token})
+            event({}, "stop", {"usage": usage} if (body.get("stream_options") or {}).get("include_usage") else None)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti en cours de stream (requête annulée ou couverte)
+            self.close_connection = True
+
+def make_server(host="127.0.0.1", port=8765, verbose=False, **settings) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.settings = MockSettings(**settings)
+    server.verbose = verbose
+    return server
+
+def start_in_thread(host="127.0.0.1", port=0, **settings) -> ThreadingHTTPServer:
+    """Démarre le serveur en arrière-plan (port 0 = port libre) ; l'URL est dans server.base_url."""
+    server = make_server(host, port, **settings)
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, name="smartshell-mock", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur mock compatible OpenAI pour SmartShell")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.0, help="Délai avant le premier token (secondes)")
+    parser.add_argument("--tps", type=float, default=0.0, help="Tokens par seconde (0 = sans limite)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de requêtes en erreur (0-1)")
+    parser.add_argument("--error-status", type=int, default=500, help="Code HTTP des erreurs injectées")
+    parser.add_argument("--responses", help="Fichier JSON de réponses (clés plan, commands, decision, summary, default, doc)")
+    parser.add_argument("--seed", type=int, help="Graine de l'injection d'erreurs")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Journaliser chaque requête")
+    args = parser.parse_args()
+    responses = None
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+    server = make_server(args.host, args.port, verbose=args.verbose, ttft=args.ttft, tps=args.tps,
+                         error_rate=args.error_rate, error_status=args.error_status,
+                         responses=responses, seed=args.seed)
+    print(f"Serveur mock SmartShell sur http://{args.host}:{args.port}/v1 (Ctrl+C pour arrêter)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        s = server.settings
+        print(f"\n{s.requests} requêtes servies, {s.errors} erreurs injectées.")
+
+if __name__ == "__main__":
+    main()
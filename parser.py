@@ -11,3 +11,113 @@ def parse_response(response, hide=False) -> dict or None:
             console.print(f"[red]Erreur de parsing JSON LLM: {e}[/red]")
             console.print(response)
         return None
+
+class StreamingResponseParser:
+    """Parse incrémental d'une réponse JSON en cours de stream.
+
+    feed() renvoie des événements dès qu'ils sont disponibles :
+    ("explanation", texte partiel), ("explanation_end", texte complet),
+    ("command", commande) pour chaque élément fermé de commands[] et
+    ("commands_end", liste des commandes).
+    """
+
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self._stack = []
+        self._expect_key = False
+        self._key = None
+        self._in_string = False
+        self._escape = False
+        self._unicode = None
+        self._high_surrogate = None
+        self._role = None
+        self._buf = []
+        self.explanation = None
+        self.commands = []
+        self.commands_done = False
+        self._explanation_parts = []
+
+    def feed(self, text) -> list:
+        events = []
+        delta = []
+        for ch in text:
+            if self._in_string:
+                if self._unicode is not None:
+                    self._unicode += ch
+                    if len(self._unicode) == 4:
+                        code = int(self._unicode, 16) if all(c in "0123456789abcdefABCDEF" for c in self._unicode) else 0xFFFD
+                        self._unicode = None
+                        if 0xD800 <= code < 0xDC00:
+                            self._high_surrogate = code
+                            continue
+                        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+                        self._high_surrogate = None
+                        self._char(chr(code), delta)
+                elif self._escape:
+                    self._escape = False
+                    if ch == 'u':
+                        self._unicode = ""
+                    else:
+                        self._char(self._ESCAPES.get(ch, ch), delta)
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(events, delta)
+                else:
+                    self._char(ch, delta)
+                continue
+            depth = len(self._stack)
+            if ch == '"':
+                self._in_string = True
+                self._buf = []
+                if depth == 1 and self._expect_key:
+                    self._role = "key"
+                elif depth == 1 and self._key == "explanation":
+                    self._role = "explanation"
+                elif depth == 2 and self._stack[1] == '[' and self._key == "commands":
+                    self._role = "command"
+                else:
+                    self._role = None
+            elif ch in '{[':
+                self._stack.append(ch)
+                if depth == 0 and ch == '{':
+                    self._expect_key = True
+            elif ch in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if ch == ']' and depth == 2 and self._key == "commands" and not self.commands_done:
+                    self.commands_done = True
+                    events.append(("commands_end", list(self.commands)))
+            elif depth == 1 and ch == ':':
+                self._expect_key = False
+            elif depth == 1 and ch == ',':
+                self._expect_key = True
+        if delta:
+            # Un seul événement par fragment reçu plutôt qu'un par caractère
+            events.insert(0, ("explanation", "".join(delta)))
+        return events
+
+    def _char(self, ch, delta):
+        if self._role == "explanation":
+            delta.append(ch)
+            self._explanation_parts.append(ch)
+        elif self._role is not None:
+            self._buf.append(ch)
+
+    def _end_string(self, events, delta):
+        if self._role == "key":
+            self._key = "".join(self._buf)
+        elif self._role == "explanation":
+            self.explanation = "".join(self._explanation_parts)
+            if delta:
+                events.append(("explanation", "".join(delta)))
+                delta.clear()
+            events.append(("explanation_end", self.explanation))
+        elif self._role == "command":
+            command = "".join(self._buf)
+            self.commands.append(command)
+            events.append(("command", command))
+        self._role = None
@@ -0,0 +1,36 @@
+import re
+import threading
+from collections import deque
+from rich.console import Group
+from rich.spinner import Spinner
+from rich.text import Text
+
+# Clés JSON masquées dans l'aperçu ("explanation": ...) et caractères de structure
+_KEY_RE = re.compile(r'"[a-zA-Z_]+":')
+_STRIP_TABLE = str.maketrans("", "", '{}"')
+
+class StreamPreview:
+    """Aperçu live d'une réponse en cours de stream.
+
+    Seuls les `size` derniers caractères sont conservés (tampon circulaire) et le
+    rendu n'est construit qu'au rythme de rafraîchissement de Live, via __rich__ :
+    le coût par fragment reçu reste constant quelle que soit la longueur de la réponse.
+    """
+
+    def __init__(self, size=300, text="[bold green]SmartShell pense…[/bold green]", raw=True):
+        self.spinner = Spinner("dots", text=text, style="green")
+        self.raw = raw
+        self._buf = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def feed(self, delta):
+        if self.raw:
+            # Fragment JSON brut : retirer clés et ponctuation pour l'affichage
+            delta = _KEY_RE.sub("", delta).translate(_STRIP_TABLE)
+        with self._lock:
+            self._buf.extend(delta)
+
+    def __rich__(self):
+        with self._lock:
+            snippet = "".join(self._buf)
+        return Group(self.spinner, Text(snippet, style="purple"))
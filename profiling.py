@@ -0,0 +1,210 @@
+import io
+import os
+import sys
+import time
+import threading
+import functools
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from config import profile_dir
+
+MODES = ("sampling", "cprofile")
+
+class SamplingProfiler:
+    """Échantillonne périodiquement la pile de tous les threads.
+
+    Contrairement à cProfile (thread principal seulement), le travail fait dans la boucle
+    asyncio du client (stream, parsing incrémental) et dans le rafraîchissement de rich Live
+    est visible. Seuls les échantillons pris pendant une section profilée sont comptés.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.active = False
+        self.ticks = 0
+        self.self_counts = Counter()
+        self.cumulative = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="smartshell-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def enable(self):
+        self.active = True
+
+    def disable(self):
+        self.active = False
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if not self.active:
+                continue
+            self.ticks += 1
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                thread = names.get(ident, str(ident))
+                seen = set()
+                leaf = True
+                while frame is not None:
+                    code = frame.f_code
+                    key = (thread, code.co_filename, code.co_firstlineno, code.co_name)
+                    if leaf:
+                        self.self_counts[key] += 1
+                        leaf = False
+                    if key not in seen:
+                        self.cumulative[key] += 1
+                        seen.add(key)
+                    frame = frame.f_back
+
+    def report(self, top) -> str:
+        out = io.StringIO()
+        out.write(f"Échantillons : {self.ticks} (intervalle {self.interval * 1000:.0f} ms, % du temps profilé, par thread)\n")
+        for title, counts in (("Temps propre", self.self_counts), ("Temps cumulé", self.cumulative)):
+            out.write(f"\n== {title} ==\n")
+            for (thread, filename, line, name), n in counts.most_common(top):
+                pct = 100 * n / self.ticks if self.ticks else 0
+                out.write(f"{pct:6.1f}%  {n:7d}  [{thread}] {name} ({_short(filename)}:{line})\n")
+        return out.getvalue()
+
+def _short(filename) -> str:
+    parts = filename.split(os.sep)
+    return os.sep.join(parts[-2:])
+
+class CProfiler:
+    """cProfile sur le thread principal : nombre d'appels et temps exacts."""
+
+    def __init__(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def enable(self):
+        self.profile.enable()
+
+    def disable(self):
+        self.profile.disable()
+
+    def report(self, top) -> str:
+        import pstats
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out)
+        for key in ("cumulative", "tottime"):
+            out.write(f"\n== Tri : {key} ==\n")
+            stats.sort_stats(key).print_stats(top)
+        return out.getvalue()
+
+class Profiler:
+    """Profilage à la demande des sections instrumentées (process_user_input, agentique_mode...).
+
+    Les sections imbriquées ne réactivent pas le profileur ; le temps est aussi agrégé par
+    section. tracemalloc (optionnel) compare la mémoire allouée entre start() et stop().
+    """
+
+    def __init__(self, top=30):
+        self.top = top
+        self.backend = None
+        self.mode = None
+        self.memory = False
+        self.sections = defaultdict(lambda: [0, 0.0])
+        self._depth = 0
+        self._snapshot = None
+        self._started = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def start(self, mode="sampling", memory=False):
+        if self.enabled:
+            self.stop()
+        self.mode = mode
+        self.backend = CProfiler() if mode == "cprofile" else SamplingProfiler()
+        self.backend.start()
+        self.memory = memory
+        self.sections.clear()
+        self._started = time.time()
+        if memory:
+            import tracemalloc
+            tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+
+    @contextmanager
+    def section(self, label):
+        if not self.enabled:
+            yield
+            return
+        backend = self.backend
+        outer = self._depth == 0
+        self._depth += 1
+        if outer:
+            backend.enable()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = self.sections[label]
+            stats[0] += 1
+            stats[1] += time.perf_counter() - started
+            self._depth -= 1
+            if outer:
+                # `profile off` peut arrêter le profileur au milieu de sa propre section
+                backend.disable()
+
+    def stop(self) -> str or None:
+        """Arrête le profilage et écrit le rapport ; renvoie son chemin (None si rien à écrire)."""
+        if not self.enabled:
+            return None
+        backend, self.backend = self.backend, None
+        backend.disable()
+        backend.stop()
+        out = io.StringIO()
+        out.write(f"Profil SmartShell ({self.mode}) du {datetime.fromtimestamp(self._started):%Y-%m-%d %H:%M:%S}, "
+                  f"durée {time.time() - self._started:.1f}s\n\n== Sections ==\n")
+        for label, (count, total) in sorted(self.sections.items(), key=lambda x: -x[1][1]):
+            out.write(f"{total:9.3f}s  {count:5d} appel(s)  {label}\n")
+        out.write("\n" + backend.report(self.top))
+        if self.memory:
+            out.write(self._memory_report())
+        path = os.path.join(profile_dir, f"profile_{datetime.now():%Y%m%d_%H%M%S}.txt")
+        os.makedirs(profile_dir, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(out.getvalue())
+        return path
+
+    def _memory_report(self) -> str:
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        diff = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+        tracemalloc.stop()
+        self._snapshot = None
+        lines = [f"\n== Mémoire (tracemalloc) : actuelle {current / 1024:.0f} Kio, pic {peak / 1024:.0f} Kio ==\n"]
+        lines.extend(f"{stat}\n" for stat in diff[:self.top])
+        return "".join(lines)
+
+profiler = Profiler()
+
+def profiled(label):
+    """Décorateur : la fonction est une section profilée quand le profilage est actif."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profiler.section(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
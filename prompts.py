@@ -0,0 +1,56 @@
+import os
+from config import executor_parallel, config
+from utils import get_os_info
+
+SYSTEM_PROMPT = """
+You are an intelligent Bash wizard on {os_name} {os_version}.
+User: {user}.
+Answer in the language of the user's request.
+Don't use interactive commands.
+Output only a JSON object with keys: explanation (string), commands (array of strings), script (string, optional).
+If the user prompt explicitly requests a script (by mentioning 'script') or if the task cannot be accomplished by commands only, include the 'script' key containing a complete bash script fulfilling the request.
+"""
+
+PARALLEL_PROMPT = """
+If the commands are independent of each other and can safely run concurrently, add "parallel": true.
+If only some of them depend on others, instead add "depends": an array with, for each command, the array of indices (0-based) of the earlier commands it must wait for.
+"""
+
+class PromptBuilder:
+    """Construit les messages envoyés au LLM.
+
+    Le préfixe (prompt système + instructions persistantes) est calculé une seule fois
+    et reste identique octet pour octet d'une requête à l'autre, toujours placé avant
+    le contenu variable : les backends avec cache de préfixe peuvent le réutiliser.
+    Il n'est recalculé que lorsque les instructions changent (Config.instructions_version).
+    """
+
+    def __init__(self):
+        self._prefix = None
+        self._version = None
+
+    def prefix(self) -> list:
+        if self._prefix is None or self._version != config.instructions_version:
+            os_info = get_os_info()
+            sys_prompt = SYSTEM_PROMPT.format(
+                os_name=os_info.get('name', ''),
+                os_version=os_info.get('version', ''),
+                user=os.environ.get("USER", "user"),
+            )
+            if executor_parallel:
+                sys_prompt += PARALLEL_PROMPT
+            prefix = [{"role": "system", "content": sys_prompt}]
+            for instr in config.instructions:
+                prefix.append({"role": "system", "content": f"User special instruction: {instr}"})
+            self._prefix = tuple(prefix)
+            self._version = config.instructions_version
+        return list(self._prefix)
+
+    def build(self, prompt, context=None) -> list:
+        msgs = self.prefix()
+        if context:
+            msgs.extend(context)
+        msgs.append({"role": "user", "content": prompt})
+        return msgs
+
+prompt_builder = PromptBuilder()
@@ -0,0 +1,175 @@
+import os
+import re
+import json
+import math
+from collections import Counter, defaultdict
+from config import context_dir, docs_dir, scripts_dir, cache_dir, retrieval_top_k, retrieval_token_budget
+import ctxstore
+from tokens import token_accountant
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+le la les un une des du de d l et ou en au aux pour par sur dans avec sans que qui quoi est sont ce cette ces
+il elle on nous vous ils je tu me te se ne pas plus a the an and or of to in on for with is are be this that it
+""".split())
+SNIPPET_CHARS = 1000
+INDEX_VERSION = 1
+
+def tokenize(text) -> list:
+    return [w for w in _WORD_RE.findall(text.lower()) if len(w) > 1 and w not in STOPWORDS]
+
+def _chunks(text, size=SNIPPET_CHARS):
+    """Découpe un document texte en blocs de paragraphes d'environ `size` caractères."""
+    buf = ""
+    for para in re.split(r"\n\s*\n", text):
+        if buf and len(buf) + len(para) > size:
+            yield buf
+            buf = ""
+        buf = f"{buf}\n\n{para}" if buf else para
+    if buf.strip():
+        yield buf
+
+class SearchIndex:
+    """Index inversé BM25 local sur les contextes sauvegardés, la documentation et les scripts.
+
+    Les fichiers ne sont (ré)indexés que si leur taille ou date de modification a changé ;
+    l'index est persisté dans cache_dir.
+    """
+
+    def __init__(self, path, sources, k1=1.5, b=0.75):
+        self.path = path
+        self.sources = sources
+        self.k1 = k1
+        self.b = b
+        self.files = None
+        self._postings = None
+
+    def _load(self):
+        self.files = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, f)
+        os.replace(tmp, self.path)
+
+    def _candidates(self) -> dict:
+        found = {}
+        for directory, extensions in self.sources:
+            if not directory:
+                continue
+            try:
+                with os.scandir(directory) as it:
+                    for e in it:
+                        if e.is_file() and (not extensions or e.name.endswith(extensions)):
+                            st = e.stat()
+                            found[e.path] = (st.st_mtime, st.st_size)
+            except OSError:
+                continue
+        return found
+
+    @staticmethod
+    def _documents(path) -> list:
+        docs = []
+        if path.endswith((ctxstore.EXTENSION, ".txt")):
+            for m in ctxstore.iter_messages(path):
+                content = m.get("content") or ""
+                if content and not m.get("summary"):
+                    docs.append(f"{m.get('role')}: {content}")
+        else:
+            with open(path, errors="replace") as f:
+                docs.extend(_chunks(f.read()))
+        indexed = []
+        for text in docs:
+            terms = tokenize(text)
+            if terms:
+                indexed.append({"text": text[:SNIPPET_CHARS], "tf": dict(Counter(terms)), "len": len(terms)})
+        return indexed
+
+    def refresh(self) -> bool:
+        """Met l'index à jour ; True si des fichiers ont été (ré)indexés ou retirés."""
+        if self.files is None:
+            self._load()
+        candidates = self._candidates()
+        changed = False
+        for path in list(self.files):
+            if path not in candidates:
+                del self.files[path]
+                changed = True
+        for path, (mtime, size) in candidates.items():
+            entry = self.files.get(path)
+            if entry and entry["mtime"] == mtime and entry["size"] == size:
+                continue
+            try:
+                docs = self._documents(path)
+            except Exception:
+                docs = []
+            self.files[path] = {"mtime": mtime, "size": size, "docs": docs}
+            changed = True
+        if changed:
+            try:
+                self._save()
+            except OSError:
+                pass
+        if changed or self._postings is None:
+            self._build()
+        return changed
+
+    def _build(self):
+        self._docs = []
+        self._postings = defaultdict(list)
+        for path, entry in self.files.items():
+            for doc in entry["docs"]:
+                doc_id = len(self._docs)
+                self._docs.append((path, doc["text"], doc["len"]))
+                for term, tf in doc["tf"].items():
+                    self._postings[term].append((doc_id, tf))
+        self._avg_len = (sum(d[2] for d in self._docs) / len(self._docs)) if self._docs else 0
+
+    def search(self, query, k=5) -> list:
+        """Renvoie [(score, chemin, extrait)] des k extraits les plus pertinents."""
+        self.refresh()
+        n = len(self._docs)
+        if not n:
+            return []
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                dl = self._docs[doc_id][2]
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / self._avg_len))
+        best = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [(score, self._docs[i][0], self._docs[i][1]) for i, score in best]
+
+    def attachment(self, query, k=None, token_budget=None, model=None) -> list:
+        """Message système avec les extraits pertinents tenant dans le budget de tokens ([] si aucun)."""
+        k = k or retrieval_top_k
+        budget = token_budget or retrieval_token_budget
+        parts, used = [], 0
+        for _, path, text in self.search(query, k):
+            cost = token_accountant.count(text, model)
+            if used + cost > budget:
+                continue
+            parts.append(f"[{os.path.basename(path)}]\n{text}")
+            used += cost
+        if not parts:
+            return []
+        return [{"role": "system", "content": "Relevant snippets from past sessions (may be outdated):\n\n" + "\n\n".join(parts)}]
+
+search_index = SearchIndex(
+    os.path.join(cache_dir, "search_index.json") if cache_dir else None,
+    [(context_dir, (ctxstore.EXTENSION, ".txt")), (docs_dir, (".md",)), (scripts_dir, None)],
+)
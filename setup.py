@@ -21,12 +21,26 @@ setup(
     author_email="nils@begou.dev",
     url="https://smartshell.fieryaura.eu/",
     py_modules=[
+        "batch",
+        "cache",
         "client",
+        "compaction",
         "config",
+        "conversation",
+        "ctxstore",
+        "daemon",
+        "endpoints",
         "executor",
+        "mockserver",
         "parser",
+        "preview",
+        "profiling",
+        "prompts",
+        "retrieval",
         "shell",
         "smartshell",
+        "telemetry",
+        "tokens",
         "utils",
         "wizard"
     ],
@@ -35,7 +49,8 @@ setup(
     data_files=[("", ["smartshell.yaml.example"])],
     entry_points={
         "console_scripts": [
-            "smartshell=smartshell:main"
+            "smartshell=smartshell:main",
+            "smartshell-mock=mockserver:main"
         ]
     },
     classifiers=[
@@ -10,29 +10,51 @@ from rich.console import Console
 from rich.panel import Panel
 from rich.columns import Columns
 from rich.progress import Progress, BarColumn, TimeElapsedColumn, SpinnerColumn
+from rich.live import Live
 import yaml
 import sys
 from rich.table import Table
+from rich.syntax import Syntax
 from rich import box
 
-from client import send_to_openai, openai2doc
+from client import send_to_openai, stream_to_openai, openai2doc, get_pool
 from parser import parse_response
-from executor import execute_command, generate_script
-from utils import check_update
-from config import docs_dir, context_dir, history_file, token_limit, config
-import wizard
+from preview import StreamPreview
+from executor import run_commands, generate_script, OutputCapture, PtyShell, strip_ansi
+from utils import check_update, UpdateChecker
+from config import docs_dir, context_dir, history_file, token_limit, autosave, retrieval_auto_attach, retrieval_top_k, config
+from cache import response_cache
+import telemetry
+from tokens import token_accountant
+from conversation import Context, sanitize_context
+from compaction import compactor
+from retrieval import search_index
+import ctxstore
+from profiling import profiler, profiled, MODES as PROFILE_MODES
 from pathlib import Path
 console = Console()
 
-# Sanitize context roles for LLM API (convert non-standard roles like 'bash' to 'user')
-def sanitize_context(raw_context):
-    sanitized = []
-    for m in raw_context:
-        role = m.get('role')
-        if role not in ('system','user','assistant','tool'):
-            role = 'user'
-        sanitized.append({'role': role, 'content': m.get('content', '')})
-    return sanitized
+def wait_for_commands(stream) -> bool:
+    """Attend la fermeture de commands[] dans la réponse en cours. False si le stream se termine avant."""
+    preview = StreamPreview(raw=False)
+    with Live(preview, refresh_per_second=10, transient=True, console=console):
+        for kind, value in stream:
+            if kind == "explanation":
+                preview.feed(value)
+            elif kind == "commands_end":
+                return True
+    return False
+
+def show_result(command, result):
+    if len(result) > 0:
+        console.print(Panel(result, title=f"Sortie de: {command.split()[0]}", expand=False))
+
+def confirm_and_run(commands, hints=None):
+    # hints : réponse complète (ou fonction la renvoyant, la réponse pouvant encore être en cours de stream)
+    console.print(Panel(f"[bold green]{'; '.join(commands)}[/bold green]", title="Commandes", expand=False))
+    confirm = console.input(f"[bold yellow]Voulez-vous exécuter les commandes ci-dessus ? (y/n)[/bold yellow] ")
+    if confirm.lower() == "y":
+        run_commands(commands, hints, on_result=show_result)
 
 def get_prompt(bash=False) -> FormattedText:
     user = os.environ.get("USER","user")
@@ -60,6 +82,13 @@ def bash_int(context) -> tuple[list, bool]:  # returns (details, extracted_flag)
     console.print("[bold green]Bienvenue dans le mode bash interactif.[/bold green]")
     console.print("[bold blue]Commandes bash: exit | list | help | extract <start:end|n|n,n>[/bold blue]")
     session = PromptSession(history=FileHistory(history_file_bash), style=style)
+    pty_shell = PtyShell()
+    try:
+        return _bash_loop(context, details, session, style, pty_shell)
+    finally:
+        pty_shell.close()
+
+def _bash_loop(context, details, session, style, pty_shell) -> tuple[list, bool]:
     while True:
         user_input = session.prompt(get_prompt(bash=True), style=style).strip()
         # exit, list, help, extract handling
@@ -109,40 +138,23 @@ def bash_int(context) -> tuple[list, bool]:  # returns (details, extracted_flag)
             return details, True
         elif len(user_input) == 0:
             continue
-        elif user_input.startswith("cd"):
-            try:
-                target = user_input[3:].strip() or home_dir
-                os.chdir(target)
-                code, out, err = 0, "", ""
-            except Exception as e:
-                code, out, err = 1, "", str(e)
-            details.append({"command": user_input, "stdout": out, "stderr": err, "exit_code": code})
-            continue
-        try:
-            subprocess.run([sys.executable, "-m", "pip", "install", "--upgrade",
-                            "git+https://github.com/nils010485/smartshell.git"], check=True)
-            console.print("[green]Mise à jour terminée. Redémarrez SmartShell.[/green]")
-            sys.exit(0)
-        except Exception as e:
-            console.print(Panel(str(e), title="Erreur interne", style="bold red", expand=False))
+        # Exécution dans le bash persistant : sortie affichée en direct et capturée (bornée)
+        capture = OutputCapture()
+        code, cwd = pty_shell.run(user_input, capture)
+        out = strip_ansi(capture.text())
+        if out and not out.endswith("\n"):
+            print()
+        # Suivre le `cd` du shell : l'invite, puis la session d'exécution des commandes de ask et
+        # agentique (resynchronisée avant sa prochaine commande), repartent de ce répertoire
+        if cwd and os.path.isdir(cwd):
+            os.chdir(cwd)
+        details.append({"command": user_input, "stdout": out, "stderr": "", "exit_code": code})
     return details, False
 
+@profiled("process_user_input")
 def process_user_input(user_input, model, context):
-    # Check context fullness and summarize if above 80% of limit
-    if token_limit and token_limit != 0:
-        total_t = estimate_tokens(context, model)
-        if total_t >= token_limit * 0.8:
-            console.print("[bold blue]SmartShell résume votre conversation...[/bold blue]")
-            # prompt for summary
-            summary_prompt = (
-                "Please provide a concise but detailed summary of the following conversation, "
-                "preserving important details. Output only the summary text.\nConversation:\n" +
-                "\n".join(f"{m['role']}: {m['content']}" for m in context)
-            )
-            summary = send_to_openai(model, summary_prompt, [])
-            context.clear()
-            context.append({'role':'system','content':summary})
-            total_t = estimate_tokens(context, model)
+    # Compaction glissante au-delà du seuil (80% de token_limit par défaut)
+    compactor.compact(context, model)
     if len(user_input) == 0:
         return
     # Aliases for faster commands
@@ -163,43 +175,48 @@ def process_user_input(user_input, model, context):
         if len(context) == 0:
             console.print("[bold yellow]Veuillez exécuter au moins une commande avant de sauvegarder le contexte.[/bold yellow]")
             return
-        context_path = os.path.join(context_dir, f"saved_context_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+        context_path = os.path.join(context_dir, f"saved_context_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ctxstore.EXTENSION}")
         try:
-            with open(context_path, 'w') as f:
-                f.write('\n'.join([json.dumps(message) for message in context]))
+            ctxstore.save(context_path, context)
             console.print(f"[bold green]Contexte sauvegardé dans : {context_path}[/bold green]")
         except Exception as e:
             console.print(f"[bold red]Erreur lors de la sauvegarde du contexte : {e}[/bold red]")
     elif user_input.startswith("load"):
-        context_file = user_input[5:]
-        if len(context_file) == 0:
+        parts = user_input.split()
+        if len(parts) < 2:
             console.print("[bold yellow]Veuillez spécifier un fichier de contexte à charger.[/bold yellow]")
             return
-        context_file = os.path.join(context_dir, context_file)
+        if len(parts) > 3 or (len(parts) == 3 and not parts[2].isdigit()):
+            console.print("[bold yellow]Usage: load <fichier> [derniers N messages][/bold yellow]")
+            return
+        last = int(parts[2]) if len(parts) == 3 else None
+        context_file = os.path.join(context_dir, parts[1])
         if not os.path.exists(context_file):
             console.print("[bold red]Fichier de contexte introuvable.[/bold red]")
             return
         try:
-            l = len(context)
-            with open(context_file, 'r') as f:
-                data = f.read().splitlines()
-                with Progress(
-                        "[progress.description]{task.description}",
-                        BarColumn(),
-                        "[progress.percentage]{task.percentage:>3.0f}%",
-                        TimeElapsedColumn(),
-                        SpinnerColumn("dots"),
-                ) as progress:
-                    task = progress.add_task("[bold green]Chargement du contexte...[/bold green]", total=len(data))
-                    for elm in data:
-                        elm = json.loads(elm)
-                        if elm.get("role") not in ["user", "assistant"] or not elm.get("content"):
-                            console.print("[bold red]Fichier de contexte invalide.[/bold red]")
-                            return
-                        context.append({"role": elm["role"], "content": elm["content"]})
-                        progress.update(task, advance=1)
-                    progress.stop_task(task)
-                console.print(f"[bold green]✅ {len(context) - l} messages ajoutés au contexte.[/bold green]")
+            total = ctxstore.count(context_file)
+            loaded = []
+            with Progress(
+                    "[progress.description]{task.description}",
+                    BarColumn(),
+                    "[progress.percentage]{task.percentage:>3.0f}%",
+                    TimeElapsedColumn(),
+                    SpinnerColumn("dots"),
+            ) as progress:
+                task = progress.add_task("[bold green]Chargement du contexte...[/bold green]",
+                                         total=min(total, last) if last is not None else total)
+                for elm in ctxstore.iter_messages(context_file, last=last):
+                    if elm.get("role") not in ("user", "assistant", "system", "bash", "tool") or not isinstance(elm.get("content"), str):
+                        console.print("[bold red]Fichier de contexte invalide.[/bold red]")
+                        return
+                    loaded.append(elm)
+                    if len(loaded) % ctxstore.BLOCK_SIZE == 0:
+                        progress.update(task, completed=len(loaded))
+                progress.update(task, completed=len(loaded))
+                progress.stop_task(task)
+            context.extend(loaded)
+            console.print(f"[bold green]✅ {len(loaded)} messages ajoutés au contexte.[/bold green]")
             console.print(f"[bold green]Contexte chargé depuis : {context_file}[/bold green]")
         except Exception as e:
             console.print(f"[bold red]Erreur lors du chargement du contexte : {e}[/bold red]")
@@ -210,7 +227,7 @@ def process_user_input(user_input, model, context):
         text = "SmartShell est entrain de penser"
         with console.status(status="[bold green]" + text + "[bold green]", spinner="dots", spinner_style="bold blue"):
             try:
-                doc = openai2doc(model, context)
+                doc = openai2doc(model, sanitize_context(context))
             except Exception as e:
                 console.print(f"[bold red]Erreur lors de la génération de la documentation : {e}[/bold red]")
                 return
@@ -229,42 +246,37 @@ def process_user_input(user_input, model, context):
         console.clear()
         return
     elif user_input == "context clear":
-        context = []
+        context.clear()
         console.print("[bold green]Contexte effacé.[/bold green]")
         return
     elif user_input.startswith("clear") or user_input.startswith("context clear"):
         console.print("[bold yellow]Pour effacer l’écran, tapez 'clear'. Pour effacer le contexte, tapez 'context clear'.[/bold yellow]")
         return
     elif user_input.startswith("ask"):
-        # compression avant un nouvel ask
-        if token_limit and estimate_tokens(context, model) >= token_limit * 0.8:
-            console.print("[bold blue]SmartShell résume votre conversation...[/bold blue]")
-            summary = send_to_openai(model, "Resume la conversation précédente en détails mais concis.", [])
-            context.clear()
-            context.append({'role':'system','content':summary})
         prompt = user_input[4:]
         if len(prompt) == 0:
             console.print("[bold yellow]Veuillez entrer un prompt.[/bold yellow]")
             return
-        response = send_to_openai(model, prompt, sanitize_context(context))
+        api_ctx = sanitize_context(context)
+        if retrieval_auto_attach:
+            api_ctx += search_index.attachment(prompt, model=model)
+        stream = stream_to_openai(model, prompt, api_ctx, call_site="ask")
+        # Afficher explication et commandes dès que commands[] est fermé, sans attendre la fin du stream
+        shown = set()
+        if wait_for_commands(stream):
+            if stream.parser.explanation is not None:
+                console.print(Panel(stream.parser.explanation, title="Explications", expand=False))
+                shown.add("explanation")
+            confirm_and_run(stream.parser.commands, lambda: parse_response(stream.result(), hide=True))
+            shown.add("commands")
+        response = stream.result()
         parsed_response = parse_response(response)
         if parsed_response:
-            if "explanation" in parsed_response:
+            if "explanation" in parsed_response and "explanation" not in shown:
                 console.print(Panel(parsed_response["explanation"], title="Explications", expand=False))
-            if "commands" in parsed_response:
-                commands = parsed_response["commands"]
-                console.print(Panel(f"[bold green]{'; '.join(commands)}[/bold green]", title="Commandes", expand=False))
-                confirm = console.input(f"[bold yellow]Voulez-vous exécuter les commandes ci-dessus ? (y/n)[/bold yellow] ")
-                if confirm.lower() == "y":
-                    for command in commands:
-                        result = execute_command(command)
-                        console.print(Panel(result, title=f"Sortie de: {command.split()[0]}", expand=False))
-                    context.append({"role": "user", "content": prompt})
-                    context.append({"role": "assistant", "content": response})
-                else:
-                    context.append({"role": "user", "content": prompt})
-                    context.append({"role": "assistant", "content": response})
-            if "generate_script" in parsed_response:
+            if "commands" in parsed_response and "commands" not in shown:
+                confirm_and_run(parsed_response["commands"], parsed_response)
+            if "script" in parsed_response:
                 script_content = parsed_response.get("script", "")
                 console.print(Panel(
                     Syntax(
@@ -280,9 +292,8 @@ def process_user_input(user_input, model, context):
                         console.print(f"[bold green]Script enregistré dans : {path}[/bold green]")
                     else:
                         console.print("[bold red]Erreur lors de l'enregistrement du script.[/bold red]")
-            else:
-                context.append({"role": "user", "content": prompt})
-                context.append({"role": "assistant", "content": response})
+            context.append({"role": "user", "content": prompt})
+            context.append({"role": "assistant", "content": response})
         else:
             console.print("[bold red]Erreur: Je ne suis pas bien sûr de ce que vous essayez de faire.[/bold red]")
     elif user_input.startswith("script"):
@@ -294,7 +305,7 @@ def process_user_input(user_input, model, context):
         # S'assurer que 'script' est mentionné pour l'IA
         script_prompt = prompt if "script" in prompt.lower() else f"{prompt} --script"
         context.append({"role":"user","content":script_prompt})
-        response = send_to_openai(model, script_prompt, sanitize_context(context))
+        response = send_to_openai(model, script_prompt, sanitize_context(context), call_site="script")
         parsed = parse_response(response)
         if parsed and "script" in parsed:
             panels = []
@@ -323,7 +334,7 @@ def process_user_input(user_input, model, context):
             return
         context.append({"role": "user", "content": prompt})
         while True:
-            response = send_to_openai(model, prompt, sanitize_context(context))
+            response = send_to_openai(model, prompt, sanitize_context(context), call_site="int")
             parsed_response = parse_response(response)
             if parsed_response:
                 if "explanation" in parsed_response:
@@ -349,11 +360,8 @@ def process_user_input(user_input, model, context):
                     console.print(Panel(f"[bold green]{'; '.join(commands)}[/bold green]", title="Commandes", expand=False))
                     confirm = console.input(f"[bold yellow]Voulez-vous exécuter les commandes ci-dessus ? (y/n)[/bold yellow] ")
                     if confirm.lower() == "y":
-                        result = None
-                        for command in commands:
-                            result = execute_command(command)
-                            if len(result) > 0:
-                                console.print(Panel(result, title=f"Sortie de: {command.split()[0]}", expand=False))
+                        results = run_commands(commands, parsed_response, on_result=show_result)
+                        result = results[-1] if results else None
                         if result:
                             send_output = console.input("[bold yellow]Voulez-vous envoyer la sortie de la commande au LLM ? (y/n)[/bold yellow] ")
                             if send_output.lower() == "y":
@@ -386,6 +394,7 @@ def process_user_input(user_input, model, context):
         cfg_path = Path(__file__).parent / 'smartshell.yaml'
         if not cfg_path.exists():
             console.print(Panel("Configuration absente, lancement du wizard...", title="Conf", style="bold yellow"))
+            import wizard
             wizard.main()
         else:
             data = yaml.safe_load(cfg_path.read_text())
@@ -406,6 +415,7 @@ def process_user_input(user_input, model, context):
             console.print(Panel(table, title="Configuration actuelle", expand=False))
             ans = console.input("[bold yellow]Modifier la config ? (y/n)[/bold yellow] ")
             if ans.lower() == 'y':
+                import wizard
                 wizard.main()
         return
     elif user_input.startswith("bash"):
@@ -453,6 +463,18 @@ def process_user_input(user_input, model, context):
         table.add_row(str(total_msgs), str(total_chars), str(total_t), lim)
         console.print(table)
         return
+    elif user_input.startswith("context search"):
+        query = user_input[len("context search"):].strip()
+        if not query:
+            console.print("[bold yellow]Usage: context search <requête>[/bold yellow]")
+            return
+        results = search_index.search(query, k=retrieval_top_k * 2)
+        if not results:
+            console.print("[bold yellow]Aucun résultat.[/bold yellow]")
+            return
+        for score, path, text in results:
+            console.print(Panel(text, title=f"{os.path.basename(path)} ({score:.2f})", expand=False))
+        return
     elif user_input.startswith("context remove"):
         # supprimer un message du contexte par son ID
         parts = user_input.split()
@@ -474,11 +496,11 @@ def process_user_input(user_input, model, context):
         total_max = len(context)
         for idx, message in enumerate(context, 1):
             console.print(f"[bold yellow]({idx}/{total_max})[/bold yellow]")
-            if message["role"] == "user":
-                console.print(Panel(message["content"], title="Utilisateur", expand=False, style="bold blue"))
-            elif message["role"] == "system":
+            if message.role == "user":
+                console.print(Panel(message.content, title="Utilisateur", expand=False, style="bold blue"))
+            elif message.role == "system":
                 # Try to parse JSON content and display panels by key
-                parsed_sys = parse_response(message["content"], hide=True)
+                parsed_sys = message.parsed
                 if parsed_sys:
                     panels_sys = []
                     if "explanation" in parsed_sys:
@@ -489,9 +511,9 @@ def process_user_input(user_input, model, context):
                         panels_sys.append(Panel(parsed_sys["script"], title="Script", expand=False, style="bold green"))
                     console.print(Columns(panels_sys))
                 else:
-                    console.print(Panel(message["content"], title="Système", expand=False, style="bold magenta"))
-            elif message["role"] == "assistant":
-                parsed = parse_response(message["content"], hide=True)
+                    console.print(Panel(message.content, title="Système", expand=False, style="bold magenta"))
+            elif message.role == "assistant":
+                parsed = message.parsed
                 if not parsed:
                     console.print(Panel("Commande enregistrée.", title="Système", expand=False, style="bold purple"))
                     continue
@@ -512,21 +534,101 @@ def process_user_input(user_input, model, context):
                     if "script" in parsed:
                         import re, uuid
                         from rich.syntax import Syntax
-                        title = re.search(r"# NAME=(.*?)\n", message["content"])
+                        title = re.search(r"# NAME=(.*?)\n", message.content)
                         script_title = title.group(1) if title else f"script_{uuid.uuid4().hex}"
                         panels.append(Panel(Syntax(parsed["script"], "bash", theme="monokai", line_numbers=True), title=script_title, expand=False))
                     if panels:
                         console.print(Columns(panels))
                     else:
-                        console.print(Panel(message["content"], title="Assistant", expand=False, style="bold green"))
-            elif message["role"] == "bash":
-                console.print(Panel(message["content"], title="Bash", expand=False, style="bold magenta"))
+                        console.print(Panel(message.content, title="Assistant", expand=False, style="bold green"))
+            elif message.role == "bash":
+                console.print(Panel(message.content, title="Bash", expand=False, style="bold magenta"))
+        return
+    elif user_input.startswith("profile"):
+        parts = user_input.split()
+        action = parts[1] if len(parts) > 1 else None
+        if action == "on":
+            mode = next((p for p in parts[2:] if p in PROFILE_MODES), "sampling")
+            profiler.start(mode, memory="mem" in parts[2:])
+            console.print(f"[bold green]Profilage activé ({mode}{', mémoire' if profiler.memory else ''}).[/bold green]")
+        elif action == "off":
+            path = profiler.stop()
+            if path:
+                console.print(f"[bold green]Rapport de profilage : {path}[/bold green]")
+            else:
+                console.print("[bold yellow]Le profilage n'est pas actif.[/bold yellow]")
+        elif action is None:
+            state = f"actif ({profiler.mode})" if profiler.enabled else "inactif"
+            console.print(f"[bold blue]Profilage {state}.[/bold blue]")
+        else:
+            console.print("[bold yellow]Usage: profile [on [sampling|cprofile] [mem] | off][/bold yellow]")
+        return
+    elif user_input.startswith("perf"):
+        parts = user_input.split()
+        if len(parts) > 1 and parts[1] == "clear":
+            telemetry.clear()
+            console.print("[bold green]Mesures de performance effacées.[/bold green]")
+            return
+        if len(parts) > 1 and parts[1] == "endpoints":
+            table = Table(title="Endpoints (session courante)", box=box.SIMPLE_HEAD)
+            for col in ("Endpoint", "État", "Req", "Err", "Latence", "p95"):
+                table.add_column(col, justify="left" if col in ("Endpoint", "État") else "right")
+            for ep in get_pool().ranked():
+                p95 = telemetry.percentile(ep.latencies, 95)
+                table.add_row(ep.name, "ok" if ep.available else "écarté", str(ep.requests), str(ep.errors),
+                              f"{ep.ewma:.2f}s" if ep.ewma is not None else "-", f"{p95:.2f}s" if p95 is not None else "-")
+            console.print(table)
+            return
+        sites = telemetry.summarize(telemetry.load())
+        if not sites:
+            console.print(f"[bold yellow]Aucune mesure enregistrée ({telemetry.perf_file}).[/bold yellow]")
+            return
+        def fmt(values, p, unit="s"):
+            v = telemetry.percentile(values, p)
+            if v is None:
+                return "-"
+            return f"{v:.2f}" if unit == "s" else f"{v:.0f}"
+        table = Table(title="Latence LLM par site d'appel (secondes)", box=box.SIMPLE_HEAD)
+        table.add_column("Site", no_wrap=True)
+        for col in ("Req", "Err", "Cache", "TTFT50", "TTFT95", "Tot50", "Tot95", "Tok/s", "Car."):
+            table.add_column(col, justify="right")
+        for site, st in sorted(sites.items()):
+            table.add_row(site, str(st["count"]), str(st["errors"]), str(st["cached"]),
+                          fmt(st["ttft"], 50), fmt(st["ttft"], 95), fmt(st["total"], 50), fmt(st["total"], 95),
+                          fmt(st["tps"], 50, ""), fmt(st["prompt_chars"], 50, ""))
+        console.print(table)
+        return
+    elif user_input.startswith("cache"):
+        parts = user_input.split()
+        action = parts[1] if len(parts) > 1 else "stats"
+        if action == "stats":
+            stats = response_cache.stats()
+            total = stats["hits"] + stats["misses"]
+            ratio = f"{stats['hits'] * 100 // total}%" if total else "-"
+            table = Table(title="Cache des réponses", box=box.SQUARE)
+            table.add_column("État")
+            table.add_column("Entrées", justify="right")
+            table.add_column("Taille", justify="right")
+            table.add_column("Hits", justify="right")
+            table.add_column("Misses", justify="right")
+            table.add_column("Ratio", justify="right")
+            table.add_row("actif" if stats["enabled"] else "désactivé", str(stats["entries"]),
+                          f"{stats['size'] / 1024:.1f} Ko", str(stats["hits"]), str(stats["misses"]), ratio)
+            console.print(table)
+        elif action == "clear":
+            removed = response_cache.clear()
+            console.print(f"[bold green]{removed} réponses supprimées du cache.[/bold green]")
+        elif action in ("on", "off"):
+            response_cache.enabled = action == "on"
+            console.print(f"[bold green]Cache {'activé' if response_cache.enabled else 'désactivé'}.[/bold green]")
+        else:
+            console.print("[bold yellow]Usage: cache stats|clear|on|off[/bold yellow]")
         return
     elif user_input.startswith("help"):
         help_text = """[bold blue]Commandes générales :[/bold blue]
 [bold yellow]help[/bold yellow] : Afficher ce message.
 [bold yellow]save[/bold yellow] : Sauvegarder le contexte actuel.
-[bold yellow]load <file>[/bold yellow] : Charger un contexte sauvegardé.
+[bold yellow]load <file> [n][/bold yellow] : Charger un contexte sauvegardé (optionnellement les n derniers messages).
 [bold yellow]clear[/bold yellow] : Effacer l’écran.
 [bold yellow]context clear[/bold yellow] : Effacer le contexte.
 [bold yellow]update[/bold yellow] : Vérifier les mises à jour.
@@ -534,6 +636,7 @@ def process_user_input(user_input, model, context):
 [bold blue]Contexte :[/bold blue]
 [bold yellow]context[/bold yellow] : Affichage détaillé du contexte.
 [bold yellow]context stats[/bold yellow] : Afficher les statistiques du contexte.
+[bold yellow]context search <requête>[/bold yellow] : Rechercher dans les contextes, docs et scripts sauvegardés.
 [bold yellow]context clear[/bold yellow] : Supprime l'entiéreté du contexte.
 [bold yellow]context remove <id>[/bold yellow] : Supprimer le message d’indice <id> du contexte.
 
@@ -545,6 +648,17 @@ def process_user_input(user_input, model, context):
 [bold blue]Configuration :[/bold blue]
 [bold yellow]conf[/bold yellow] : Afficher/éditer la configuration.
 
+[bold blue]Performance :[/bold blue]
+[bold yellow]perf[/bold yellow] : Percentiles de latence LLM (TTFT, total, tokens/s) par site d'appel.
+[bold yellow]profile on [sampling|cprofile] [mem] / profile off[/bold yellow] : Profiler les commandes, rapport écrit à côté de docs_dir.
+[bold yellow]perf endpoints[/bold yellow] : Santé et latence des endpoints LLM.
+[bold yellow]perf clear[/bold yellow] : Effacer les mesures.
+
+[bold blue]Cache :[/bold blue]
+[bold yellow]cache stats[/bold yellow] : Afficher les hits/misses du cache des réponses.
+[bold yellow]cache clear[/bold yellow] : Vider le cache des réponses.
+[bold yellow]cache on|off[/bold yellow] : Activer/désactiver le cache pour la session.
+
 [bold blue]Instructions persistantes :[/bold blue]
 [bold yellow]instruction list[/bold yellow]  : Lister les instructions LLM.
 [bold yellow]instruction add <texte>[/bold yellow]   : Ajouter une instruction.
@@ -604,34 +718,29 @@ def process_user_input(user_input, model, context):
 
 # Estimate tokens in context using tiktoken or fallback
 def estimate_tokens(messages, model=None):
-    try:
-        import tiktoken
-        enc = tiktoken.encoding_for_model(model or openai_force_model)
-        return sum(len(enc.encode(m.get('content',''))) for m in messages)
-    except Exception:
-        # Fallback: approximate as 1 token per 3 characters
-        total_chars = sum(len(m.get('content','')) for m in messages)
-        return total_chars // 3
+    if isinstance(messages, Context):
+        return messages.tokens(model)
+    return token_accountant.total(messages, model)
+
+def offer_update(version):
+    console.print(f"[yellow]Nouvelle version disponible ({version}) ![/yellow]")
+    ans = console.input("[bold yellow]Voulez-vous mettre à jour automatiquement ? (y/n) [/bold yellow]")
+    if ans.lower() == 'y':
+        console.print("[blue]Mise à jour en cours...[/blue]")
+        try:
+            subprocess.run(["pip", "install", "--upgrade", "git+https://github.com/nils010485/smartshell.git"], check=True)
+            console.print("[green]Mise à jour terminée. Redémarrez SmartShell.[/green]")
+            sys.exit(0)
+        except Exception:
+            console.print("[red]La mise à jour a échoué. Veuillez mettre à jour manuellement en faisant : git clone https://github.com/nils010485/smartshell.git && pip install .[/red]")
+    else:
+        console.print("[yellow]Pour mettre à jour manuellement, exécutez : git clone https://github.com/nils010485/smartshell.git && pip install .[/yellow]")
 
 def interactive_shell(model):
-    # Vérification de mise à jour au lancement du shell interactif
-    try:
-        if check_update(mod="quick"):
-            console.print("[yellow]Nouvelle version disponible ![/yellow]")
-            ans = console.input("[bold yellow]Voulez-vous mettre à jour automatiquement ? (y/n) [/bold yellow]")
-            if ans.lower() == 'y':
-                console.print("[blue]Mise à jour en cours...[/blue]")
-                try:
-                    subprocess.run(["pip", "install", "--upgrade", "git+https://github.com/nils010485/smartshell.git"], check=True)
-                    console.print("[green]Mise à jour terminée. Redémarrez SmartShell.[/green]")
-                    sys.exit(0)
-                except Exception:
-                    console.print("[red]La mise à jour a échoué. Veuillez mettre à jour manuellement en faisant : git clone https://github.com/nils010485/smartshell.git && pip install .[/red]")
-            else:
-                console.print("[yellow]Pour mettre à jour manuellement, exécutez : git clone https://github.com/nils010485/smartshell.git && pip install .[/yellow]")
-    except Exception as e:
-        console.print(f"[red]Erreur vérification update: {e}[/red]")
-    context = []
+    # Vérification de mise à jour en arrière-plan : annoncée dès que le résultat arrive
+    updates = UpdateChecker().start()
+    context = Context()
+    journal = restore_autosave(context) if autosave else None
     session = PromptSession(history=FileHistory(history_file))
     style_prompt = Style.from_dict({
         "username": "bold ansibrightred",
@@ -640,19 +749,55 @@ def interactive_shell(model):
     })
     while True:
         try:
+            version = updates.notice()
+            if version:
+                offer_update(version)
             user_input = session.prompt(get_prompt(), style=style_prompt)
             user_input = user_input.strip()
             if user_input.lower() in ["exit", "quit"]:
                 console.print("[bold green]Au revoir ![/bold green]")
                 break
-            if user_input == "context clear":
-                context = []
-                console.print("[bold green]Contexte effacé.[/bold green]")
-                continue
             process_user_input(user_input, model, context)
         except KeyboardInterrupt:
             console.print("[bold green]\nAu revoir ![/bold green]")
             break
+    # Sortie propre : le journal d'autosauvegarde n'est plus utile
+    if journal:
+        journal.close()
+    path = profiler.stop()
+    if path:
+        console.print(f"[bold green]Rapport de profilage : {path}[/bold green]")
+
+def restore_autosave(context) -> ctxstore.Journal:
+    """Propose de restaurer la dernière session interrompue, puis journalise le contexte courant."""
+    orphans = ctxstore.Journal.orphans(context_dir)
+    if orphans:
+        path = orphans[-1]
+        try:
+            messages = ctxstore.Journal.replay(path)
+        except Exception as e:
+            console.print(f"[red]Journal d'autosauvegarde illisible ({path}): {e}[/red]")
+            messages = []
+        if messages:
+            ans = console.input(f"[bold yellow]Une session précédente s'est terminée anormalement ({len(messages)} messages). Restaurer son contexte ? (y/n) [/bold yellow]")
+            if ans.lower() == 'y':
+                context.extend(messages)
+                console.print(f"[bold green]✅ {len(messages)} messages restaurés.[/bold green]")
+        # Journaux plus anciens : la session la plus récente a été restaurée ou écartée
+        for orphan in orphans:
+            try:
+                os.remove(orphan)
+            except OSError:
+                pass
+        if len(orphans) > 1:
+            console.print(f"[yellow]{len(orphans) - 1} journal(aux) d'autosauvegarde plus ancien(s) supprimé(s).[/yellow]")
+    journal = ctxstore.Journal(context_dir)
+    try:
+        context.attach_journal(journal)
+    except OSError as e:
+        console.print(f"[red]Autosauvegarde désactivée: {e}[/red]")
+        return None
+    return journal
 
 def input_parser(user_input, output) -> list:
     if not user_input:
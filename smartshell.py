@@ -1,37 +1,81 @@
+import time
+_started = time.perf_counter()
 import argparse
+import os
+from contextlib import nullcontext
 import sys
 from rich.console import Console
 from rich.panel import Panel
-from rich.columns import Columns
-from rich.table import Table
-from rich import box
 
-from config import openai_force_model, token_limit, config
+from config import openai_force_model, agentique_prefetch, retrieval_auto_attach
 from utils import check_dir
-from client import send_to_openai
 from parser import parse_response
-from executor import execute_command
-from shell import interactive_shell, estimate_tokens
+from profiling import profiler, profiled, MODES as PROFILE_MODES
 
 console = Console()
 
-def sanitize_context(raw_context):
-    sanitized = []
-    for m in raw_context:
-        role = m.get('role')
-        if role not in ('system','user','assistant','tool'):
-            role = 'user'
-        sanitized.append({'role': role, 'content': m.get('content', '')})
-    return sanitized
+def step_prompt(step) -> str:
+    return f"Pour l'étape: {step}, répond en JSON avec clé 'commands': [cmds]."
+
+class StepPrefetcher:
+    """Génération spéculative des commandes des étapes à venir (mode agentique pipeliné).
+
+    Les requêtes partent pendant la validation et l'exécution de l'étape courante ; un
+    résultat n'est utilisé que si le plan n'a pas changé, sinon discard() l'abandonne.
+    """
+
+    def __init__(self, model, enabled):
+        self.model = model
+        self.enabled = enabled
+        self.pending = {}
+
+    def start(self, idx, step, context):
+        if not self.enabled or idx in self.pending:
+            return
+        from client import prefetch_openai
+        from conversation import sanitize_context
+        future = prefetch_openai(self.model, step_prompt(step), sanitize_context(context),
+                                 call_site="agentique_step", required_keys=("commands",))
+        self.pending[idx] = (step, future)
+
+    def take(self, idx, step) -> str or None:
+        step_pending, future = self.pending.pop(idx, (None, None))
+        if future is None or step_pending != step:
+            if future:
+                future.cancel()
+            return None
+        try:
+            with console.status("[bold green]SmartShell pense…[/bold green]", spinner="dots"):
+                return future.result()
+        except Exception:
+            # Échec de la requête spéculative : on repasse par le chemin normal
+            return None
+
+    def discard(self):
+        for _, future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+def show_step_result(command, result):
+    console.print(Panel(command, title="Commande", expand=False))
+    console.print(Panel(result, title="Résultat", expand=False))
 
 # Agentique mode: autonomous planning and execution with user validation
-def agentique_mode(model, objective, context=None):
-    # Compression du contexte si seuil de tokens atteint (80%)
-    if token_limit and context and estimate_tokens(context, model) >= token_limit * 0.8:
-        console.print("[bold blue]SmartShell résume votre conversation...[/bold blue]")
-        summary = send_to_openai(model, "Resume la conversation précédente en détails mais concis.", [])
-        # conserver l'historique complet et ajouter le résumé comme message système
-        context.append({'role':'system','content': summary})
+@profiled("agentique_mode")
+def agentique_mode(model, objective, context=None, prefetch=None):
+    from rich.columns import Columns
+    from rich.table import Table
+    from rich import box
+    from executor import run_commands
+    from client import send_to_openai
+    from conversation import Context, sanitize_context
+    from compaction import compactor
+    from retrieval import search_index
+    if prefetch is None:
+        prefetch = agentique_prefetch
+    # Compaction glissante du contexte si seuil de tokens atteint
+    if context:
+        compactor.compact(context, model, call_site="agentique_summary")
     # Gestion du contexte existant
     if context:
         ans = console.input(f"[bold yellow]Le contexte contient {len(context)} messages. L'agentique doit-il y avoir accès ? (y/n) [/bold yellow]")
@@ -43,10 +87,12 @@ def agentique_mode(model, objective, context=None):
     prompt_plan = f"Objectif : {objective}. Planifie les étapes pour atteindre cet objectif. N'ouvre pas de terminal, tu es déjà dans une ! Répond uniquement en JSON avec clé 'plan': [étapes]."
     # Envoi du prompt pour génération du plan
     api_ctx = sanitize_context(context or [])
-    response = send_to_openai(model, prompt_plan, api_ctx)
+    if retrieval_auto_attach:
+        api_ctx += search_index.attachment(objective, model=model)
+    response = send_to_openai(model, prompt_plan, api_ctx, call_site="agentique_plan", required_keys=("plan",))
     # Initialisation du contexte avec le prompt et la réponse
     if context is None:
-        context = []
+        context = Context()
     context.append({"role": "user", "content": prompt_plan})
     context.append({"role": "assistant", "content": response})
     out = parse_response(response)
@@ -63,16 +109,22 @@ def agentique_mode(model, objective, context=None):
     console.print(table)
     # Exécution et adaptation
     auto = False
+    prefetcher = StepPrefetcher(model, prefetch)
     try:
         while True:
+            prefetcher.discard()
             for idx, step in enumerate(plan, start=1):
                 console.print(Panel(step, title=f"Étape {idx}/{len(plan)}", style="bold yellow", expand=False))
+                # Pipeline : commandes de cette étape et de la suivante demandées pendant la validation
+                prefetcher.start(idx, step, context)
+                if idx < len(plan):
+                    prefetcher.start(idx + 1, plan[idx], context)
                 choice = console.input("[bold yellow]Valider ? (y/n/a)[/bold yellow] ") if not auto else 'y'
                 if choice.lower() == 'n':
                     comment = console.input("[bold yellow]Commentaire (optionnel) :[/bold yellow] ")
                     fb = f"Étape refusée: {step}." + (f" Commentaire: {comment}" if comment else "")
                     context.append({"role":"user","content":fb})
-                    resp2 = send_to_openai(model, f"{fb} Révise le plan en JSON avec 'plan'.", sanitize_context(context))
+                    resp2 = send_to_openai(model, f"{fb} Révise le plan en JSON avec 'plan'.", sanitize_context(context), call_site="agentique_plan", required_keys=("plan",))
                     context.append({"role":"assistant","content":resp2})
                     out2 = parse_response(resp2)
                     if out2 and 'plan' in out2:
@@ -86,7 +138,7 @@ def agentique_mode(model, objective, context=None):
                 if choice.lower() not in ('y','n','a'):
                     fb = f"Feedback utilisateur: {choice}"
                     context.append({"role":"user","content":fb})
-                    resp2 = send_to_openai(model, f"{fb} Révise le plan en JSON avec 'plan'.", sanitize_context(context))
+                    resp2 = send_to_openai(model, f"{fb} Révise le plan en JSON avec 'plan'.", sanitize_context(context), call_site="agentique_plan", required_keys=("plan",))
                     context.append({"role":"assistant","content":resp2})
                     out2 = parse_response(resp2)
                     if out2 and 'plan' in out2:
@@ -97,27 +149,26 @@ def agentique_mode(model, objective, context=None):
                     console.print(Panel("Impossible de réviser le plan.", style="bold red", expand=False))
                     return
                 if choice.lower() == 'a': auto = True
-                # Génération des commandes
-                resp3 = send_to_openai(model, f"Pour l'étape: {step}, répond en JSON avec clé 'commands': [cmds].", sanitize_context(context))
+                # Génération des commandes (résultat spéculatif si disponible)
+                resp3 = prefetcher.take(idx, step)
+                if resp3 is None:
+                    resp3 = send_to_openai(model, step_prompt(step), sanitize_context(context), call_site="agentique_step", required_keys=("commands",))
                 context.append({"role":"assistant","content":resp3})
                 out3 = parse_response(resp3)
                 cmds = out3.get('commands', []) if out3 else []
                 last = ""
-                for c in cmds:
-                    console.print(Panel(c, title="Commande", expand=False))
-                    res = execute_command(c)
-                    console.print(Panel(res, title="Résultat", expand=False))
+                for c, res in zip(cmds, run_commands(cmds, out3, on_result=show_step_result)):
                     context.extend([{"role":"user","content":c},{"role":"assistant","content":res}])
                     last = res
                 # Décision suivante (replan / continue / complete)
-                # Tronquer le contexte uniquement si on dépasse le seuil de tokens (80%) pour garder un historique gérable
-                if token_limit and estimate_tokens(context, model) >= token_limit * 0.8:
-                    if len(context) > 20:
-                        context = context[-20:]
+                # Compaction glissante si on dépasse le seuil de tokens, derniers échanges conservés
+                compactor.compact(context, model, call_site="agentique_summary")
                 resp4 = send_to_openai(
                     model,
                     f"Résultats: {last}. Répond uniquement en JSON avec les clés 'action' et 'result'. 'action' doit être 'replan', 'continue' ou 'complete'. Si 'replan', ajoute 'plan' avec liste d'étapes. Si 'complete', ajoute 'result' contenant la réponse finale de l'agent.",
-                    sanitize_context(context)
+                    sanitize_context(context),
+                    call_site="agentique_decision",
+                    required_keys=("action",)
                 )
                 context.append({"role":"assistant","content":resp4})
                 out4 = parse_response(resp4)
@@ -137,7 +188,7 @@ def agentique_mode(model, objective, context=None):
                         # Envoi du feedback à l'agent
                         fb = f"Feedback utilisateur: {fb_choice}"
                         context.append({"role": "user", "content": fb})
-                        resp_fb = send_to_openai(model, fb + " Révise la réponse précédente.", sanitize_context(context))
+                        resp_fb = send_to_openai(model, fb + " Révise la réponse précédente.", sanitize_context(context), call_site="agentique_feedback")
                         # Affichage de la réponse au feedback, parsing JSON si possible
                         out_fb = parse_response(resp_fb, hide=True)
                         if out_fb:
@@ -166,19 +217,70 @@ def agentique_mode(model, objective, context=None):
     except (KeyboardInterrupt, EOFError):
         console.print("[bold green]Retour au menu agentique interrompu[/bold green]")
         return
+    finally:
+        prefetcher.discard()
+
+# Budget de démarrage à froid (imports + config, hors interpréteur) pour `smartshell ask`
+STARTUP_BUDGET_MS = 150
+# Modules lourds qui ne doivent être chargés que sur le chemin qui en a besoin
+HEAVY_MODULES = ("openai", "prompt_toolkit", "requests", "tiktoken", "rich.live", "rich.syntax", "wizard", "shell")
+
+def report_startup():
+    """Affiche (SMARTSHELL_DEBUG_STARTUP=1) le temps de démarrage et les modules lourds déjà chargés."""
+    elapsed = (time.perf_counter() - _started) * 1000
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+    status = "OK" if elapsed <= STARTUP_BUDGET_MS else "DÉPASSÉ"
+    print(f"[startup] {elapsed:.1f} ms (budget {STARTUP_BUDGET_MS} ms : {status}), "
+          f"modules lourds chargés : {', '.join(loaded) or 'aucun'}", file=sys.stderr)
+
+def positive_int(value) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"doit être au moins 1 (reçu {value})")
+    return n
 
 def main():
     parser = argparse.ArgumentParser(description="SmartShell")
-    parser.add_argument("command", choices=["ask", "shell", "agentique"], nargs="?", default="shell", help="ask, shell, ou agentique (par défaut 'shell')")
-    parser.add_argument("prompt", nargs="?", help="Texte pour ask ou agentique")
+    parser.add_argument("command", choices=["ask", "shell", "agentique", "batch", "daemon"], nargs="?", default="shell", help="ask, shell, agentique, batch ou daemon (par défaut 'shell')")
+    parser.add_argument("prompt", nargs="?", help="Texte pour ask ou agentique ; fichier de requêtes pour batch (stdin par défaut) ; start, stop ou status pour daemon")
     parser.add_argument("-m", "--model", default=openai_force_model, help="Modèle OpenAI à utiliser")
+    parser.add_argument("--no-cache", action="store_true", help="Ignorer le cache des réponses LLM")
+    parser.add_argument("--prefetch", action="store_true", default=None, help="Agentique : générer les commandes de l'étape suivante en avance")
+    parser.add_argument("-j", "--concurrency", type=positive_int, default=None, help="Batch : requêtes simultanées (défaut : api.openai_max_concurrency)")
+    parser.add_argument("-o", "--output", help="Batch : fichier JSONL de sortie (stdout par défaut)")
+    parser.add_argument("--execute", choices=["none", "dry-run", "parallel"], default="none", help="Batch : ne rien exécuter, vérifier la syntaxe, ou exécuter les commandes en parallèle")
+    parser.add_argument("--profile", action="store_true", help="Profiler la commande et écrire un rapport à côté de docs_dir")
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default="sampling", help="sampling : tous les threads ; cprofile : thread principal, appels exacts")
+    parser.add_argument("--profile-memory", action="store_true", help="Ajouter au rapport les allocations mémoire (tracemalloc)")
     args = parser.parse_args()
+    if os.environ.get("SMARTSHELL_DEBUG_STARTUP"):
+        report_startup()
+    if args.profile:
+        profiler.start(args.profile_mode, args.profile_memory)
+    try:
+        # Le shell interactif ne profile que ses commandes (process_user_input), pas l'attente au prompt
+        with profiler.section(args.command) if args.command != "shell" else nullcontext():
+            run_command(parser, args)
+    finally:
+        path = profiler.stop()
+        if path:
+            console.print(f"[green]Rapport de profilage : {path}[/green]")
+
+def run_command(parser, args):
+    if args.no_cache:
+        from cache import response_cache
+        response_cache.enabled = False
 
     if args.command == "ask":
         if not args.prompt:
             parser.error("ask requiert un prompt")
         prompt_text = args.prompt
-        response = send_to_openai(args.model, prompt_text)
+        # Daemon résident s'il tourne (client déjà chauffé), sinon requête en processus
+        import daemon
+        response = daemon.ask(args.model, prompt_text, use_cache=not args.no_cache)
+        if response is None:
+            from client import send_to_openai
+            response = send_to_openai(args.model, prompt_text, call_site="ask")
         out = parse_response(response)
         if not out:
             console.print("[red]Erreur: réponse non comprise.[/red]")
@@ -187,12 +289,46 @@ def main():
             console.print(Panel(out["explanation"], title="Explications"))
         if "commands" in out:
             console.print(Panel("; ".join(out["commands"]), title="Commandes"))
+    elif args.command == "batch":
+        import batch
+        if args.prompt and args.prompt != "-":
+            with open(args.prompt) as f:
+                items = batch.read_prompts(f)
+        else:
+            items = batch.read_prompts(sys.stdin)
+        output = open(args.output, "w") if args.output else None
+        try:
+            stats = batch.BatchRunner(args.model, args.concurrency, args.execute, output).run(items)
+        finally:
+            if output:
+                output.close()
+        batch.report(stats)
+        if stats["errors"]:
+            sys.exit(1)
+    elif args.command == "daemon":
+        import daemon
+        action = args.prompt or "start"
+        if action == "start":
+            sys.exit(daemon.Daemon().serve())
+        elif action == "stop":
+            if not daemon.stop():
+                console.print("[yellow]Aucun daemon en cours d'exécution.[/yellow]")
+        elif action == "status":
+            info = daemon.status()
+            if info is None:
+                console.print("[yellow]Aucun daemon en cours d'exécution.[/yellow]")
+            else:
+                console.print(f"[green]Daemon actif : pid {info['pid']}, {info['requests']} requêtes, "
+                              f"démarré il y a {info['uptime']:.0f}s[/green]")
+        else:
+            parser.error("daemon : start, stop ou status")
     elif args.command == "agentique":
         if not args.prompt:
             parser.error("agentique requiert un prompt")
         prompt_text = args.prompt
-        agentique_mode(args.model, prompt_text)
+        agentique_mode(args.model, prompt_text, prefetch=args.prefetch)
     else:
+        from shell import interactive_shell
         console.print("""[yellow]
   _________                      __   _________.__           .__  .__   
  /   _____/ _____ _____ ________/  |_/   _____/|  |__   ____ |  | |  |  
@@ -0,0 +1,66 @@
+import os
+import json
+from fractions import Fraction
+import time
+from collections import deque, defaultdict
+from config import perf_file
+
+def record(entry):
+    """Ajoute une mesure de requête LLM au journal JSONL (append-only)."""
+    if not perf_file:
+        return
+    entry.setdefault("ts", time.time())
+    try:
+        os.makedirs(os.path.dirname(perf_file), exist_ok=True)
+        with open(perf_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError:
+        # La télémétrie ne doit jamais faire échouer une requête
+        pass
+
+def load(limit=5000) -> list:
+    """Charge les `limit` dernières mesures."""
+    try:
+        with open(perf_file) as f:
+            lines = deque(f, maxlen=limit)
+    except OSError:
+        return []
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+def clear():
+    try:
+        os.remove(perf_file)
+    except OSError:
+        pass
+
+def percentile(values, p) -> float or None:
+    """Percentile par rang le plus proche (p entre 0 et 100)."""
+    if not values:
+        return None
+    values = sorted(values)
+    # Rang calculé en rationnels : p / 100 * n en flottants dépasse parfois un entier (p=7, n=100)
+    k = max(0, min(len(values) - 1, -(-Fraction(str(p)) * len(values) // 100) - 1))
+    return values[k]
+
+def summarize(entries) -> dict:
+    """Regroupe les mesures par site d'appel."""
+    sites = defaultdict(lambda: {"count": 0, "errors": 0, "cached": 0, "ttft": [], "total": [], "tps": [], "prompt_chars": []})
+    for e in entries:
+        s = sites[e.get("site", "other")]
+        s["count"] += 1
+        if e.get("error"):
+            s["errors"] += 1
+            continue
+        if e.get("cached"):
+            s["cached"] += 1
+            continue
+        for key, field in (("ttft", "ttft"), ("total", "total"), ("tps", "tokens_per_s"), ("prompt_chars", "prompt_chars")):
+            if e.get(field) is not None:
+                s[key].append(e[field])
+    return dict(sites)
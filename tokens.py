@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from functools import lru_cache
+from config import openai_force_model
+
+@lru_cache(maxsize=None)
+def get_encoder(model):
+    """Encodeur tiktoken du modèle, chargé une seule fois (None si indisponible)."""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+class TokenAccountant:
+    """Comptage de tokens incrémental.
+
+    Chaque contenu n'est encodé qu'une fois (mémo borné par modèle et texte), et le total
+    d'une liste de messages est tenu à jour : tant que les messages déjà comptés sont
+    inchangés, seuls les messages ajoutés depuis le dernier appel sont comptés.
+    """
+
+    def __init__(self, max_entries=8192, max_runs=8):
+        self.max_entries = max_entries
+        self.max_runs = max_runs
+        self._memo = OrderedDict()
+        self._runs = OrderedDict()
+
+    def count(self, text, model=None) -> int:
+        if not text:
+            return 0
+        model = model or openai_force_model
+        key = (model, text)
+        n = self._memo.get(key)
+        if n is not None:
+            self._memo.move_to_end(key)
+            return n
+        enc = get_encoder(model)
+        # Repli : environ 1 token pour 3 caractères
+        n = len(enc.encode(text, disallowed_special=())) if enc else len(text) // 3
+        self._memo[key] = n
+        if len(self._memo) > self.max_entries:
+            self._memo.popitem(last=False)
+        return n
+
+    def total(self, messages, model=None) -> int:
+        model = model or openai_force_model
+        key = (id(messages), model)
+        items, total = self._runs.pop(key, ([], 0))
+        # Préfixe déjà compté encore valide (mêmes messages, même contenu) ?
+        if len(items) > len(messages) or any(
+                messages[i] is not m or m.get('content', '') is not c for i, (m, c, _) in enumerate(items)):
+            items, total = [], 0
+        for m in messages[len(items):]:
+            content = m.get('content', '')
+            n = self.count(content, model)
+            items.append((m, content, n))
+            total += n
+        self._runs[key] = (items, total)
+        if len(self._runs) > self.max_runs:
+            self._runs.popitem(last=False)
+        return total
+
+token_accountant = TokenAccountant()
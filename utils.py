@@ -1,18 +1,20 @@
 import os
 import sys
-import requests
+import json
+import time
+import threading
+from functools import lru_cache
 from rich.console import Console
-from rich.panel import Panel
-from rich.columns import Columns
-from config import updater_url, raw_version, scripts_dir, docs_dir, context_dir
+from config import updater_url, updater_timeout, updater_ttl, raw_version, scripts_dir, docs_dir, context_dir, cache_dir
 
 console = Console()
 
 def check_dir():
     """Crée les dossiers nécessaires."""
-    for d in (scripts_dir, docs_dir, context_dir):
+    for d in (scripts_dir, docs_dir, context_dir, cache_dir):
         os.makedirs(d, exist_ok=True)
 
+@lru_cache(maxsize=None)
 def get_os_info() -> dict:
     info = {}
     with open("/etc/os-release") as f:
@@ -33,9 +35,71 @@ def debug_info() -> dict:
         "smartshell_version": raw_version,
     }
 
-def check_update(mod="full"):
-    resp = requests.get(updater_url)
+UPDATE_CACHE = os.path.join(cache_dir, "update.json")
+
+def fetch_update_info(timeout=None) -> dict:
+    """Interroge l'updater (délai maximal `timeout`) et met le résultat en cache sur disque."""
+    import requests
+    resp = requests.get(updater_url, timeout=timeout or updater_timeout)
     data = resp.json()
+    try:
+        with open(UPDATE_CACHE, "w") as f:
+            json.dump({"checked": time.time(), "data": data}, f)
+    except OSError:
+        pass
+    return data
+
+def cached_update_info(ttl=None) -> dict or None:
+    """Dernier résultat de l'updater s'il date de moins de `ttl` secondes."""
+    try:
+        with open(UPDATE_CACHE) as f:
+            cached = json.load(f)
+        if time.time() - cached["checked"] < (updater_ttl if ttl is None else ttl):
+            return cached["data"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+class UpdateChecker:
+    """Vérification de mise à jour en arrière-plan : le démarrage ne dépend jamais du réseau.
+
+    Le résultat en cache est utilisé s'il est récent ; sinon l'updater est interrogé dans un
+    thread avec un délai court. notice() ne renvoie la version disponible qu'une seule fois.
+    """
+
+    def __init__(self):
+        self.data = None
+        self.error = None
+        self._done = threading.Event()
+        self._shown = False
+
+    def start(self):
+        threading.Thread(target=self._run, name="smartshell-update", daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            self.data = cached_update_info() or fetch_update_info()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    def notice(self) -> str or None:
+        if self._shown or not self._done.is_set():
+            return None
+        self._shown = True
+        try:
+            if self.data and int(self.data["raw"]) > raw_version:
+                return self.data.get("version", str(self.data["raw"]))
+        except (KeyError, TypeError, ValueError):
+            pass
+        return None
+
+def check_update(mod="full"):
+    from rich.panel import Panel
+    from rich.columns import Columns
+    data = fetch_update_info()
     if mod == "quick":
         return int(data["raw"]) > raw_version
 
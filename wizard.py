@@ -28,6 +28,7 @@ def main():
                 "docs_dir": "~/.sshell/docs",
                 "context_dir": "~/.sshell/context",
                 "history_file": "~/.smart_shell_history",
+                "cache_dir": "~/.sshell/cache",
             },
             "updater": {"url": "https://api.angelkarlsson.eu/smartshellv2/updater"},
             "token_limit": 0,